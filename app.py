@@ -1,18 +1,104 @@
-from fastapi import FastAPI, Request, HTTPException
+from dotenv import load_dotenv
+
+# Read .env before the module-level settings below; nothing under src/ loads it on import
+load_dotenv()
+
+from fastapi import FastAPI, Request, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse, Response
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import time
-from collections import defaultdict
+import math
 import os
-from src.ai_agent import AI_Agent
+from src.ai_agent import AI_Agent, ERROR_RESPONSE
+from src.rate_limiter import RateLimiter, build_backend
+from src.resilience import deadline, DependencyError, CircuitOpenError
+from src.static_assets import HashedStaticFiles
+from src.observability import (
+    request_id_var, endpoint_var, new_request_id, log_event, log_error,
+    STAGE_LATENCY, RATE_LIMIT_REJECTIONS
+)
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from datetime import datetime, timedelta
 import hashlib
-from typing import Optional
+from typing import Optional, List
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+# One AI_Agent per process, shared by all requests (built once at startup)
+agent: Optional[AI_Agent] = None
+agent_ready = False
 
-app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+def build_agent() -> Optional[AI_Agent]:
+    """Build the shared agent and warm its clients; runs off the event loop.
+
+    This is where the heavy dependencies (langchain, the model client, boto3)
+    are first imported, so the process can already serve `/` and `/static`.
+    """
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        log_event("agent_not_configured", reason="GOOGLE_API_KEY not found in environment variables.")
+        return None
+    shared_agent = AI_Agent(api_key)
+    shared_agent.warm_up()
+    return shared_agent
+
+async def warm_up_agent():
+    global agent, agent_ready
+    try:
+        agent = await asyncio.to_thread(build_agent)
+        agent_ready = agent is not None
+        if agent_ready:
+            start_history_maintenance(agent)
+    except Exception as e:
+        log_error("agent_warm_up_failed", e)
+
+# Expiry of idle histories and compaction in R2, run in-process; off unless an interval is set
+maintenance_interval = float(os.getenv("HISTORY_MAINTENANCE_INTERVAL_SECONDS", "0"))
+maintenance_task: Optional[asyncio.Task] = None
+
+def start_history_maintenance(shared_agent: AI_Agent):
+    global maintenance_task
+    from src.storage_helper import R2Storage
+    from src.history_maintenance import build_maintenance
+    if maintenance_interval <= 0 or not isinstance(shared_agent.storage, R2Storage):
+        return
+    maintenance = build_maintenance(shared_agent.storage)
+    maintenance_task = asyncio.create_task(maintenance.run_forever(maintenance_interval))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Compile the page template now; the agent is built in the background after startup
+    templates.get_template("index.html")
+    warm_up_task = asyncio.create_task(warm_up_agent())
+    eviction_task = asyncio.create_task(rate_limiter.run_eviction())
+    batch_eviction_task = asyncio.create_task(batch_rate_limiter.run_eviction())
+    yield
+    warm_up_task.cancel()
+    eviction_task.cancel()
+    batch_eviction_task.cancel()
+    if maintenance_task is not None:
+        maintenance_task.cancel()
+    if agent is not None:
+        await agent.aclose()
+
+def get_agent() -> AI_Agent:
+    """Return the shared agent, or fail the request if warm-up has not finished"""
+    if agent is None:
+        if not os.getenv("GOOGLE_API_KEY"):
+            raise HTTPException(status_code=500, detail="GOOGLE_API_KEY not found in environment variables.")
+        raise HTTPException(status_code=503, detail="Service is warming up. Please retry shortly.")
+    return agent
+
+app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None, lifespan=lifespan)
 
 # Allow CORS for local frontend
 app.add_middleware(
@@ -23,16 +109,91 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def endpoint_label(path: str) -> str:
+    """Map a request path to a bounded metrics label"""
+    if path.startswith("/static/"):
+        return "/static"
+    if any(getattr(route, "path", None) == path for route in app.routes):
+        return path
+    return "other"
+
+# Time budget for a whole request, shared by every LLM and R2 call it makes
+request_deadline_seconds = float(os.getenv("REQUEST_DEADLINE_SECONDS", "60"))
+batch_deadline_seconds = float(os.getenv("BATCH_DEADLINE_SECONDS", "300"))
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Attach a correlation ID and deadline to every request, time it, and log one JSON line"""
+    request_id = request.headers.get("x-request-id") or new_request_id()
+    request_id_var.set(request_id)
+    endpoint_var.set(endpoint_label(request.url.path))
+    started = time.perf_counter()
+    status = 500
+    budget = batch_deadline_seconds if request.url.path == "/api/chat/batch" else request_deadline_seconds
+    try:
+        # Streamed bodies run in the context captured here, so they share the deadline
+        with deadline(budget):
+            response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        duration = time.perf_counter() - started
+        outcome = "ok" if status < 400 else ("client_error" if status < 500 else "error")
+        STAGE_LATENCY.labels("request", endpoint_var.get(), outcome).observe(duration)
+        log_event(
+            "request",
+            method=request.method,
+            path=request.url.path,
+            status=status,
+            duration_ms=round(duration * 1000, 1)
+        )
+
 # Set up Jinja2 templates and static files
 templates = Jinja2Templates(directory="templates")
 
-# Serve static files from the "static" directory
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Serve static files from the "static" directory, also under content-hashed names
+# that the page links to and browsers may cache indefinitely
+static_files = HashedStaticFiles(directory="static")
+app.mount("/static", static_files, name="static")
+templates.env.globals["static_url"] = static_files.url_for
+
+# Compress responses; Brotli when brotli-asgi is installed (gzip for clients without
+# it), gzip otherwise. Server-Sent Events are left uncompressed so tokens aren't held back.
+compression_minimum_size = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1000"))
+if BrotliMiddleware is not None:
+    app.add_middleware(
+        BrotliMiddleware,
+        minimum_size=compression_minimum_size,
+        gzip_fallback=True,
+        excluded_handlers=["/api/chat/stream", "/api/chat/batch"]
+    )
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=compression_minimum_size, compresslevel=6)
+
+# Sliding-window rate limiter keyed by client IP and user ID. The default backend
+# is per-process; RATE_LIMIT_BACKEND=sqlite shares the limit across uvicorn workers.
+rate_limiter = RateLimiter(
+    limit=int(os.getenv("RATE_LIMIT_COUNT", "5")),
+    window=int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "60")),
+    backend=build_backend(
+        os.getenv("RATE_LIMIT_BACKEND", "memory"),
+        os.getenv("RATE_LIMIT_SQLITE_PATH", "/tmp/sre_agent_rate_limit.db")
+    )
+)
 
-# Simple in-memory rate limiter: {ip: [timestamps]}
-rate_limit_window = 60  # seconds
-rate_limit_count = 5
-rate_limit_data = defaultdict(list)
+# Batch requests are accounted separately, charged per message in the batch. With
+# the sqlite backend they get their own table, since the two windows can differ.
+batch_rate_limiter = RateLimiter(
+    limit=int(os.getenv("BATCH_RATE_LIMIT_MESSAGES", "100")),
+    window=int(os.getenv("BATCH_RATE_LIMIT_WINDOW_SECONDS", "60")),
+    backend=build_backend(
+        os.getenv("RATE_LIMIT_BACKEND", "memory"),
+        os.getenv("RATE_LIMIT_SQLITE_PATH", "/tmp/sre_agent_rate_limit.db"),
+        table="batch_rate_limits"
+    )
+)
+batch_max_messages = int(os.getenv("BATCH_MAX_MESSAGES", "50"))
 
 # Define the request model for chat messages
 class ChatRequest(BaseModel):
@@ -41,11 +202,18 @@ class ChatRequest(BaseModel):
 
 class ChatHistoryRequest(BaseModel):
     user_id: str
-    limit: Optional[int] = 10
+    limit: Optional[int] = Field(10, ge=1)
+    cursor: Optional[str] = None
 
 class DeleteHistoryRequest(BaseModel):
     user_id: str
 
+class BatchChatRequest(BaseModel):
+    messages: List[str]
+    user_id: Optional[str] = None
+    max_concurrency: Optional[int] = Field(None, ge=1)
+    stream: bool = False
+
 def generate_enhanced_user_id(request: Request) -> str:
     """Generate enhanced user ID using browser fingerprinting"""
     # Get basic info
@@ -59,61 +227,190 @@ def generate_enhanced_user_id(request: Request) -> str:
 
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
-    return templates.TemplateResponse(request=request, name="index.html")
+    # Revalidated on every load so new asset hashes are picked up after a deploy
+    return templates.TemplateResponse(
+        request=request, name="index.html", headers={"Cache-Control": "no-cache"}
+    )
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness probe: the process is up"""
+    return JSONResponse({"status": "ok"})
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness probe: fails until the shared agent has been built and warmed up"""
+    if not agent_ready:
+        return JSONResponse({"status": "warming_up"}, status_code=503)
+    return JSONResponse({"status": "ready"})
+
+async def check_rate_limit(request: Request, user_id: str):
+    if not await rate_limiter.aallow(f"ip:{request.client.host}", f"user:{user_id}"):
+        RATE_LIMIT_REJECTIONS.inc()
+        raise HTTPException(status_code=429, detail="Rate limit exceeded. Please wait.")
+
+def dependency_http_error(error: DependencyError) -> HTTPException:
+    """503 with Retry-After while a dependency's breaker is open, 504 when time ran out"""
+    if isinstance(error, CircuitOpenError):
+        return HTTPException(
+            status_code=503,
+            detail="The assistant is temporarily unavailable. Please retry shortly.",
+            headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+        )
+    return HTTPException(status_code=504, detail="The assistant took too long to respond. Please try again.")
+
+def sse_event(payload: dict) -> str:
+    """Format a payload as a single Server-Sent Events message"""
+    return f"data: {json.dumps(payload)}\n\n"
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency, LLM tokens, R2 bytes, rate limits, cache hits"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/api/stats")
+async def stats():
+    """Cache and write-behind counters for the shared agent"""
+    return JSONResponse(get_agent().stats())
 
 @app.post("/api/chat")
 async def chat_endpoint(request: Request, chat: ChatRequest):
-    client_ip = request.client.host
-    now = time.time()
-    timestamps = rate_limit_data[client_ip]
-    # Remove timestamps outside the window
-    rate_limit_data[client_ip] = [t for t in timestamps if now - t < rate_limit_window]
-    if len(rate_limit_data[client_ip]) >= rate_limit_count:
-        raise HTTPException(status_code=429, detail="Rate limit exceeded. Please wait.")
-    rate_limit_data[client_ip].append(now)
+    # Get user ID from request or generate enhanced one
+    user_id = chat.user_id or generate_enhanced_user_id(request)
+    await check_rate_limit(request, user_id)
 
     try:
-        # Get user ID from request or generate enhanced one
-        user_id = chat.user_id or generate_enhanced_user_id(request)
-        
-        # Use AI agent to generate response with context
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise HTTPException(status_code=500, detail="GOOGLE_API_KEY not found in environment variables.")
-        
-        agent = AI_Agent(api_key)
-        response = agent.get_response(chat.message, user_id)
+        # Use the shared AI agent to generate response with context
+        response = await get_agent().aget_response(chat.message, user_id)
         
         return JSONResponse({
             "response": response,
             "user_id": user_id
         })
+    except HTTPException:
+        raise
+    except DependencyError as e:
+        log_error("chat_dependency_unavailable", e, dependency=e.dependency)
+        raise dependency_http_error(e)
     except Exception as e:
-        print(f"Error in chat endpoint: {str(e)}")
+        log_error("chat_endpoint_failed", e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: Request, chat: ChatRequest):
+    """Stream the response as Server-Sent Events: token events, then a final done event"""
+    user_id = chat.user_id or generate_enhanced_user_id(request)
+    await check_rate_limit(request, user_id)
+    shared_agent = get_agent()
+    
+    async def event_stream():
+        try:
+            async for chunk in shared_agent.astream_response(chat.message, user_id):
+                yield sse_event({"type": "token", "content": chunk})
+            yield sse_event({"type": "done", "user_id": user_id})
+        except DependencyError as e:
+            log_error("chat_stream_dependency_unavailable", e, dependency=e.dependency)
+            error = dependency_http_error(e)
+            yield sse_event({"type": "error", "detail": error.detail, "status": error.status_code})
+        except Exception as e:
+            log_error("chat_stream_failed", e)
+            yield sse_event({"type": "error", "detail": ERROR_RESPONSE})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/chat/batch")
+async def chat_batch_endpoint(request: Request, batch: BatchChatRequest):
+    """Answer many messages concurrently; results in order, or streamed as each completes"""
+    if not batch.messages:
+        raise HTTPException(status_code=400, detail="At least one message is required")
+    if len(batch.messages) > batch_max_messages:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {batch_max_messages} messages")
+    
+    user_id = batch.user_id or generate_enhanced_user_id(request)
+    if not await batch_rate_limiter.aallow(
+        f"batch-ip:{request.client.host}", f"batch-user:{user_id}", cost=len(batch.messages)
+    ):
+        RATE_LIMIT_REJECTIONS.inc()
+        raise HTTPException(status_code=429, detail="Batch rate limit exceeded. Please wait.")
+    
+    shared_agent = get_agent()
+    max_concurrency = min(batch.max_concurrency or shared_agent.batch_concurrency, shared_agent.batch_concurrency)
+    
+    if batch.stream:
+        async def event_stream():
+            async for _, result in shared_agent.aiter_responses(batch.messages, user_id, max_concurrency):
+                yield sse_event({"type": "result", **result})
+            yield sse_event({"type": "done", "user_id": user_id})
+        
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    results = await shared_agent.aget_responses(batch.messages, user_id, max_concurrency)
+    return JSONResponse({"results": results, "user_id": user_id})
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as used for If-None-Match (compression may have weakened our ETag)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+async def history_response(request: Request, user_id: str, limit: int, cursor: Optional[str]):
+    """A page of history with an ETag derived from the stored history version.
+
+    A GET whose If-None-Match still matches is answered 304 without reading
+    the page. The response is per-user, so it is private and always revalidated.
+    """
+    if not user_id:
+        raise HTTPException(status_code=400, detail="User ID is required")
+    shared_agent = get_agent()
+    headers = {"Cache-Control": "private, no-cache"}
+    version = await shared_agent.aget_history_version(user_id)
+    if version is not None:
+        digest = hashlib.sha256(f"{user_id}|{version}|{limit}|{cursor or ''}".encode()).hexdigest()[:32]
+        headers["ETag"] = f'"{digest}"'
+        if request.method == "GET" and etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    
+    history, next_cursor = await shared_agent.aget_chat_history_page(user_id, limit, cursor)
+    return JSONResponse({"history": history, "next_cursor": next_cursor}, headers=headers)
+
+@app.get("/api/chat-history")
+async def get_chat_history_cached(request: Request, user_id: str, limit: int = Query(10, ge=1),
+                                  cursor: Optional[str] = None):
+    """Get chat history for a user; cacheable GET variant with ETag/304 support"""
+    try:
+        return await history_response(request, user_id, limit, cursor)
+    except HTTPException:
+        raise
+    except DependencyError as e:
+        log_error("history_dependency_unavailable", e, dependency=e.dependency)
+        raise dependency_http_error(e)
+    except Exception as e:
+        log_error("get_chat_history_failed", e)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch chat history: {str(e)}")
+
 @app.post("/api/chat-history")
 async def get_chat_history(request: Request, history_request: ChatHistoryRequest):
     """Get chat history for a user"""
     try:
-        user_id = history_request.user_id
-        limit = history_request.limit
-        
-        if not user_id:
-            raise HTTPException(status_code=400, detail="User ID is required")
-        
-        # Use AI agent to get chat history
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise HTTPException(status_code=500, detail="GOOGLE_API_KEY not found in environment variables.")
-        
-        agent = AI_Agent(api_key)
-        history = agent.get_chat_history(user_id, limit)
-        
-        return JSONResponse({"history": history})
-    
+        return await history_response(
+            request, history_request.user_id, history_request.limit, history_request.cursor
+        )
+    except HTTPException:
+        raise
+    except DependencyError as e:
+        log_error("history_dependency_unavailable", e, dependency=e.dependency)
+        raise dependency_http_error(e)
     except Exception as e:
-        print(f"Error in get_chat_history: {e}")
+        log_error("get_chat_history_failed", e)
         raise HTTPException(status_code=500, detail=f"Failed to fetch chat history: {str(e)}")
 
 @app.delete("/api/chat-history")
@@ -125,18 +422,16 @@ async def delete_chat_history(request: Request, delete_request: DeleteHistoryReq
         if not user_id:
             raise HTTPException(status_code=400, detail="User ID is required")
         
-        # Use AI agent to delete chat history
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise HTTPException(status_code=500, detail="GOOGLE_API_KEY not found in environment variables.")
-        
-        agent = AI_Agent(api_key)
-        agent.delete_chat_history(user_id)
+        # Use the shared AI agent to delete chat history
+        await get_agent().adelete_chat_history(user_id)
         
         return JSONResponse({"message": "Chat history deleted successfully"})
     
+    except HTTPException:
+        raise
+    except DependencyError as e:
+        log_error("delete_chat_history_dependency_unavailable", e, dependency=e.dependency)
+        raise dependency_http_error(e)
     except Exception as e:
-        print(f"Error in delete_chat_history: {e}")
+        log_error("delete_chat_history_failed", e)
         raise HTTPException(status_code=500, detail=f"Failed to delete chat history: {str(e)}")
-
-    # /api/cleanup endpoint and related code removed for now
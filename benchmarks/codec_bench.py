@@ -0,0 +1,93 @@
+"""Compare stored-history formats: bytes and decode time per conversation.
+
+Builds synthetic histories shaped like real ones (multi-KB HTML answers plus
+ISO timestamps) and measures the legacy plain-JSON format against each codec
+of the versioned format.
+
+    python -m benchmarks.codec_bench --conversations 50 --output codec.json
+"""
+import json
+import time
+import random
+import argparse
+
+from src import history_codec
+from src.history_codec import encode_history, decode_history
+
+PARAGRAPHS = [
+    "An error budget is the inverse of your SLO: at 99.9% availability you may spend 43 minutes a month on failures.",
+    "Alert on burn rate rather than raw error ratio, using a fast window to page and a slow window to open a ticket.",
+    "Prometheus recording rules keep dashboards cheap by precomputing the SLI ratios over each alerting window.",
+    "During the incident, the commander delegates investigation and owns communication with stakeholders.",
+    "Chaos experiments start with a hypothesis about steady state and a blast radius you are willing to accept.",
+]
+
+VOCABULARY = sorted({word for paragraph in PARAGRAPHS for word in paragraph.split()})
+
+
+def build_history(conversations, seed=0):
+    rng = random.Random(seed)
+    history = []
+    for i in range(conversations):
+        sections = []
+        for heading in range(rng.randint(3, 6)):
+            # Shuffled words keep the text realistic without the long exact repeats
+            # that would flatter the compressors
+            body = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(60, 160)))
+            sections.append(f"<h2>Section {heading + 1}</h2><p>{body}</p>")
+        sections.append("<pre><code>- alert: HighErrorBudgetBurn\n  expr: slo:burn_rate:1h &gt; 14.4</code></pre>")
+        history.append({
+            "user_message": f"How do I set up SLO alerting for service {i}?",
+            "bot_response": "".join(sections),
+            "timestamp": f"2026-01-{1 + i % 28:02d}T12:{i % 60:02d}:00.{i:06d}+00:00",
+        })
+    return history
+
+
+def measure(body, decode, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        decode(body)
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stored-history encodings")
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    history = build_history(args.conversations)
+    legacy = json.dumps(history, default=str).encode("utf-8")
+    formats = {"legacy-json": (legacy, lambda body: json.loads(body.decode("utf-8")))}
+    codecs = ["none", "gzip"] + (["zstd"] if history_codec.zstandard else [])
+    for codec in codecs:
+        formats[f"v1-{codec}"] = (encode_history(history, codec), decode_history)
+
+    results = []
+    for name, (body, decode) in formats.items():
+        assert decode(body) == history
+        decode_seconds = measure(body, decode, args.iterations)
+        row = {
+            "format": name,
+            "bytes": len(body),
+            "bytes_per_conversation": round(len(body) / args.conversations, 1),
+            "ratio_vs_legacy": round(len(legacy) / len(body), 2),
+            "decode_us_per_conversation": round(decode_seconds / args.conversations * 1e6, 2),
+        }
+        results.append(row)
+        print(f"{name:12s} bytes={row['bytes']:<8d} per-conv={row['bytes_per_conversation']:<8} "
+              f"x{row['ratio_vs_legacy']:<6} decode={row['decode_us_per_conversation']}us/conv")
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump({
+                "conversations": args.conversations,
+                "serializer": "orjson" if history_codec.orjson else "json",
+                "results": results,
+            }, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
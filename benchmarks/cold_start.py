@@ -0,0 +1,148 @@
+"""Measure cold start: import time and time to the first served request.
+
+Each run uses fresh interpreters, as a scaled-from-zero container would:
+
+- `python -X importtime -c "import app"` gives the total import time of the
+  app, the slowest modules, and whether any module that should be imported
+  lazily (langgraph, langchain, boto3) was loaded at import.
+- A second interpreter imports the app, runs its startup (lifespan) and
+  times the first `GET /`, then polls `/readyz` until the agent is warm.
+
+Exits 1 when a threshold is exceeded, so it can run in CI:
+
+    python -m benchmarks.cold_start --runs 3 --max-import-ms 800 --max-first-request-ms 1200
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+RESULT_PREFIX = "COLD_START_RESULT "
+
+FIRST_REQUEST_SCRIPT = """
+import time, json, asyncio
+import httpx
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+
+async def main():
+    result = {"import_ms": (imported - started) * 1000}
+    async with app_module.app.router.lifespan_context(app_module.app):
+        result["startup_ms"] = (time.perf_counter() - started) * 1000
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://cold-start") as client:
+            response = await client.get("/")
+            result["first_request_ms"] = (time.perf_counter() - started) * 1000
+            result["first_request_status"] = response.status_code
+            result["ready_ms"] = None
+            deadline = started + READY_TIMEOUT
+            while time.perf_counter() < deadline:
+                if (await client.get("/readyz")).status_code == 200:
+                    result["ready_ms"] = (time.perf_counter() - started) * 1000
+                    break
+                await asyncio.sleep(0.01)
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+
+asyncio.run(main())
+"""
+
+
+def parse_importtime(stderr):
+    """Return {module: (self_us, cumulative_us)} from `-X importtime` output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure_imports(module, cwd):
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True, check=True
+    )
+    return parse_importtime(completed.stderr)
+
+
+def measure_first_request(cwd, ready_timeout):
+    script = f"RESULT_PREFIX = {RESULT_PREFIX!r}\nREADY_TIMEOUT = {ready_timeout}\n" + FIRST_REQUEST_SCRIPT
+    completed = subprocess.run([sys.executable, "-c", script], cwd=cwd, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"First-request run failed:\n{completed.stderr[-2000:]}")
+
+
+def median(values):
+    values = [value for value in values if value is not None]
+    return round(statistics.median(values), 1) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and first-request time of the app")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per measurement; medians are reported")
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list")
+    parser.add_argument("--ready-timeout", type=float, default=10.0, help="Seconds to wait for /readyz")
+    parser.add_argument("--lazy", nargs="*", default=["langgraph", "langchain", "langchain_core", "boto3"],
+                        help="Packages that must not be imported by `import app`")
+    parser.add_argument("--max-import-ms", type=float)
+    parser.add_argument("--max-first-request-ms", type=float)
+    parser.add_argument("--max-ready-ms", type=float)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    import_runs = [measure_imports(args.module, cwd) for _ in range(args.runs)]
+    request_runs = [measure_first_request(cwd, args.ready_timeout) for _ in range(args.runs)]
+
+    modules = import_runs[-1]
+    slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    eager = sorted({name.split(".")[0] for name in modules} & set(args.lazy))
+    results = {
+        "import_ms": median(run[args.module][1] / 1000 for run in import_runs),
+        "startup_ms": median(run["startup_ms"] for run in request_runs),
+        "first_request_ms": median(run["first_request_ms"] for run in request_runs),
+        "ready_ms": median(run["ready_ms"] for run in request_runs),
+        "first_request_status": request_runs[-1]["first_request_status"],
+        "eager_imports": eager,
+        "slowest_modules": [
+            {"module": name, "self_ms": round(self_us / 1000, 1), "cumulative_ms": round(cumulative_us / 1000, 1)}
+            for name, (self_us, cumulative_us) in slowest
+        ],
+    }
+
+    print(f"import {args.module:<10s} {results['import_ms']}ms (-X importtime, median of {args.runs})")
+    print(f"startup done       {results['startup_ms']}ms")
+    print(f"first GET /        {results['first_request_ms']}ms (status {results['first_request_status']})")
+    print(f"/readyz 200        {results['ready_ms'] if results['ready_ms'] is not None else 'not ready'}"
+          f"{'ms' if results['ready_ms'] is not None else ''}")
+    print("slowest modules (self time):")
+    for row in results["slowest_modules"]:
+        print(f"  {row['self_ms']:>8}ms  {row['cumulative_ms']:>8}ms cumulative  {row['module']}")
+
+    failures = []
+    if eager:
+        failures.append(f"imported at startup but should be lazy: {', '.join(eager)}")
+    for name, limit in (("import_ms", args.max_import_ms), ("first_request_ms", args.max_first_request_ms),
+                        ("ready_ms", args.max_ready_ms)):
+        if limit is not None and (results[name] is None or results[name] > limit):
+            failures.append(f"{name} {results[name]} exceeds {limit}")
+    if results["first_request_status"] != 200:
+        failures.append(f"first GET / returned {results['first_request_status']}")
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump({**results, "failures": failures}, handle, indent=2)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
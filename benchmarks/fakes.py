@@ -0,0 +1,227 @@
+"""Deterministic, network-free stand-ins for the LLM and R2 used by the benchmarks."""
+import io
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+
+
+class FakeLLMError(Exception):
+    """Shaped like a provider API error: carries an HTTP status code"""
+
+    def __init__(self, status_code=503, message="model overloaded"):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+
+
+class FaultInjector:
+    """Seeded fault schedule shared by the fakes.
+
+    Each call fails with probability `error_rate` and, independently, is slowed
+    by `slow_latency` seconds with probability `slow_rate`. Setting `down` makes
+    every call fail, to model an outage; the attributes can be changed mid-run.
+    """
+
+    def __init__(self, error_rate=0.0, slow_rate=0.0, slow_latency=0.0, seed=0):
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.down = False
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.errors = 0
+        self.slow_calls = 0
+
+    def draw(self):
+        """Return (fail, extra_latency) for the next call"""
+        with self.lock:
+            fail = self.down or (self.error_rate and self.random.random() < self.error_rate)
+            slow = self.slow_rate and self.random.random() < self.slow_rate
+            self.errors += bool(fail)
+            self.slow_calls += bool(slow)
+        return bool(fail), self.slow_latency if slow else 0.0
+
+
+class FakeMessage:
+    def __init__(self, content, usage_metadata=None):
+        self.content = content
+        self.usage_metadata = usage_metadata
+
+
+class FakeChatModel:
+    """Drop-in for the object returned by init_chat_model (invoke/ainvoke/astream).
+
+    Responses are derived from a hash of the prompt, so runs are repeatable.
+    Latency is `first_token_latency` plus `output_tokens / tokens_per_second`,
+    with optional seeded jitter. `faults` injects errors (a 503 FakeLLMError,
+    raised before the first token) and slow calls.
+    """
+
+    def __init__(self, output_tokens=400, first_token_latency=0.3, tokens_per_second=80.0,
+                 jitter=0.0, chunk_tokens=8, seed=0, faults=None):
+        self.output_tokens = output_tokens
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+        self.chunk_tokens = chunk_tokens
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.faults = faults or FaultInjector()
+
+    def _prompt(self, messages):
+        return "\n".join(message.content for message in messages)
+
+    def _tokens(self, prompt):
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        words = ["<p>reliability", "latency", "error-budget", "SLO", "alerting", "runbook", "capacity</p>"]
+        seed = int(digest[:8], 16)
+        return [words[(seed + i) % len(words)] + " " for i in range(self.output_tokens)]
+
+    def _scale(self):
+        with self.lock:
+            self.calls += 1
+            return 1 + self.random.uniform(-self.jitter, self.jitter) if self.jitter else 1
+
+    def _usage(self, prompt):
+        return {"input_tokens": max(1, len(prompt) // 4), "output_tokens": self.output_tokens}
+
+    def invoke(self, messages):
+        prompt = self._prompt(messages)
+        scale = self._scale()
+        fail, extra = self.faults.draw()
+        time.sleep(extra if fail else (self.first_token_latency + self.output_tokens / self.tokens_per_second) * scale + extra)
+        if fail:
+            raise FakeLLMError()
+        return FakeMessage("".join(self._tokens(prompt)), self._usage(prompt))
+
+    async def ainvoke(self, messages):
+        prompt = self._prompt(messages)
+        scale = self._scale()
+        fail, extra = self.faults.draw()
+        await asyncio.sleep(extra if fail else (self.first_token_latency + self.output_tokens / self.tokens_per_second) * scale + extra)
+        if fail:
+            raise FakeLLMError()
+        return FakeMessage("".join(self._tokens(prompt)), self._usage(prompt))
+
+    async def astream(self, messages):
+        prompt = self._prompt(messages)
+        scale = self._scale()
+        tokens = self._tokens(prompt)
+        fail, extra = self.faults.draw()
+        await asyncio.sleep(extra if fail else self.first_token_latency * scale + extra)
+        if fail:
+            raise FakeLLMError()
+        for start in range(0, len(tokens), self.chunk_tokens):
+            chunk = tokens[start:start + self.chunk_tokens]
+            await asyncio.sleep(len(chunk) / self.tokens_per_second * scale)
+            yield FakeMessage("".join(chunk))
+        yield FakeMessage("", self._usage(prompt))
+
+
+class FakeS3Client:
+    """In-process S3 stand-in covering the calls R2Storage makes.
+
+    Supports conditional GET/PUT (If-None-Match / If-Match) with ETags, and
+    sleeps `latency` seconds per call to model the network round trip.
+    `faults` injects 503 SlowDown errors and slow calls.
+    """
+
+    def __init__(self, latency=0.0, faults=None):
+        self.latency = latency
+        self.faults = faults or FaultInjector()
+        self.objects = {}  # (bucket, key) -> (body, etag, last_modified)
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def _call(self, operation):
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        fail, extra = self.faults.draw()
+        if self.latency or extra:
+            time.sleep(self.latency + extra)
+        if fail:
+            raise self._error("SlowDown", 503, operation)
+
+    def _error(self, code, status, operation):
+        return ClientError(
+            {"Error": {"Code": code, "Message": code}, "ResponseMetadata": {"HTTPStatusCode": status}},
+            operation
+        )
+
+    def head_bucket(self, Bucket):
+        self._call("HeadBucket")
+        return {}
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        self._call("GetObject")
+        with self.lock:
+            stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise self._error("NoSuchKey", 404, "GetObject")
+        body, etag, last_modified = stored
+        if IfNoneMatch == etag:
+            raise self._error("304", 304, "GetObject")
+        return {"Body": io.BytesIO(body), "ETag": etag, "LastModified": last_modified,
+                "ContentLength": len(body)}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, IfMatch=None, IfNoneMatch=None, **kwargs):
+        self._call("PutObject")
+        body = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        with self.lock:
+            current = self.objects.get((Bucket, Key))
+            if IfNoneMatch == "*" and current is not None:
+                raise self._error("PreconditionFailed", 412, "PutObject")
+            if IfMatch is not None and current is None:
+                # What S3 answers for If-Match on a key that no longer exists
+                raise self._error("NoSuchKey", 404, "PutObject")
+            if IfMatch is not None and current[1] != IfMatch:
+                raise self._error("PreconditionFailed", 412, "PutObject")
+            self.objects[(Bucket, Key)] = (body, etag, datetime.now(timezone.utc))
+        return {"ETag": etag}
+
+    def delete_object(self, Bucket, Key):
+        self._call("DeleteObject")
+        with self.lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        """Batch delete; an item carrying an ETag is only deleted if the object is still at it"""
+        self._call("DeleteObjects")
+        deleted, errors = [], []
+        with self.lock:
+            for item in Delete["Objects"]:
+                current = self.objects.get((Bucket, item["Key"]))
+                if "ETag" in item and current is None:
+                    errors.append({"Key": item["Key"], "Code": "NoSuchKey", "Message": "NoSuchKey"})
+                elif "ETag" in item and current[1] != item["ETag"]:
+                    errors.append({"Key": item["Key"], "Code": "PreconditionFailed", "Message": "PreconditionFailed"})
+                else:
+                    self.objects.pop((Bucket, item["Key"]), None)
+                    deleted.append({"Key": item["Key"]})
+        response = {"Deleted": deleted}
+        if errors:
+            response["Errors"] = errors
+        return response
+
+    def list_objects_v2(self, Bucket, Prefix="", MaxKeys=1000, ContinuationToken=None, **kwargs):
+        self._call("ListObjectsV2")
+        with self.lock:
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+            if ContinuationToken:
+                keys = [key for key in keys if key > ContinuationToken]
+            page = keys[:MaxKeys]
+            contents = [
+                {"Key": key, "Size": len(self.objects[(Bucket, key)][0]),
+                 "ETag": self.objects[(Bucket, key)][1], "LastModified": self.objects[(Bucket, key)][2]}
+                for key in page
+            ]
+        response = {"Contents": contents, "KeyCount": len(contents), "IsTruncated": len(keys) > MaxKeys}
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = page[-1]
+        return response
@@ -0,0 +1,257 @@
+"""Offline load test for the FastAPI app.
+
+Runs chat, streaming chat, history-read and delete scenarios against the
+in-process ASGI app, with a fake LLM and an in-process S3 stand-in, at each
+combination of concurrency level and stored-history size. Reports p50/p95/p99
+latency, requests per second and peak RSS, and writes everything to JSON.
+The --*-error-rate and --llm-slow-* options inject faults into the fakes to
+exercise retries, hedging and the circuit breakers.
+
+    python -m benchmarks.load_test --concurrency 1 8 32 --history-sizes 0 50 \
+        --output bench.json --compare baseline.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import statistics
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.fakes import FakeChatModel, FakeS3Client, FaultInjector
+
+SCENARIOS = ("chat", "chat_stream", "history", "delete")
+
+
+def current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def build_app(args):
+    """Import the app and install a shared agent wired to the fakes"""
+    os.environ.setdefault("HISTORY_FLUSH_WINDOW_SECONDS", str(args.flush_window))
+    import app as app_module
+    from src.ai_agent import AI_Agent
+    from src.storage_helper import R2Storage
+    from src.sqlite_storage import SQLiteStorage
+    from src.rate_limiter import RateLimiter
+
+    llm = FakeChatModel(
+        output_tokens=args.output_tokens,
+        first_token_latency=args.first_token_latency,
+        tokens_per_second=args.tokens_per_second,
+        jitter=args.jitter,
+        faults=FaultInjector(args.llm_error_rate, args.llm_slow_rate, args.llm_slow_latency, seed=1)
+    )
+    if args.backend == "sqlite":
+        storage = SQLiteStorage(os.path.join(tempfile.mkdtemp(), "bench_history.db"))
+    else:
+        storage = R2Storage("sre-agent", s3_client=FakeS3Client(
+            latency=args.s3_latency, faults=FaultInjector(args.s3_error_rate, seed=2)
+        ))
+    app_module.agent = AI_Agent("offline-benchmark", llm=llm, storage=storage)
+    app_module.agent_ready = True
+    # The load generator is one client; do not let the limiter shape the results
+    app_module.rate_limiter = RateLimiter(limit=10 ** 9, window=60)
+    return app_module, storage
+
+
+def seed_history(storage, users, history_size):
+    entry = {
+        "user_message": "How should we alert on error budget burn?",
+        "bot_response": "<h2>Burn rate alerts</h2><p>" + "Multiwindow burn-rate alerting. " * 120 + "</p>",
+    }
+    for user_id in users:
+        history = [dict(entry, timestamp=f"2026-01-01T00:00:{i:02d}.{i:06d}+00:00") for i in range(history_size)]
+        if history:
+            storage.save_history(user_id, history)
+        else:
+            storage.delete_history(user_id)
+
+
+async def send(client, scenario, user_id, message):
+    if scenario == "chat":
+        response = await client.post("/api/chat", json={"message": message, "user_id": user_id})
+    elif scenario == "chat_stream":
+        async with client.stream("POST", "/api/chat/stream",
+                                 json={"message": message, "user_id": user_id}) as response:
+            async for _ in response.aiter_bytes():
+                pass
+    elif scenario == "history":
+        response = await client.post("/api/chat-history", json={"user_id": user_id, "limit": 50})
+    else:
+        response = await client.request("DELETE", "/api/chat-history", json={"user_id": user_id})
+    return response.status_code < 400
+
+
+async def run_scenario(app, scenario, concurrency, requests, users, run):
+    latencies = []
+    errors = 0
+    peak_rss = current_rss_bytes()
+    done = asyncio.Event()
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while not done.is_set():
+            peak_rss = max(peak_rss, current_rss_bytes())
+            await asyncio.sleep(0.01)
+
+    queue = asyncio.Queue()
+    for index in range(requests):
+        queue.put_nowait(index)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def worker():
+            nonlocal errors
+            while True:
+                try:
+                    index = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                started = time.perf_counter()
+                try:
+                    # Unique per run so the response cache does not serve earlier runs
+                    message = f"Run {run} question {index} about SLOs"
+                    ok = await send(client, scenario, users[index % len(users)], message)
+                except Exception:
+                    ok = False
+                latencies.append(time.perf_counter() - started)
+                errors += 0 if ok else 1
+
+        sampler = asyncio.create_task(sample_rss())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await sampler
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "peak_rss_mb": round(peak_rss / (1024 * 1024), 1),
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Return regressions where p95 or RPS moved more than `tolerance` versus the baseline"""
+    with open(baseline_path) as handle:
+        baseline = {
+            (row["scenario"], row["concurrency"], row["history_size"]): row
+            for row in json.load(handle)["results"]
+        }
+    regressions = []
+    for row in results:
+        before = baseline.get((row["scenario"], row["concurrency"], row["history_size"]))
+        if not before:
+            continue
+        if row["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{row['scenario']} c={row['concurrency']} h={row['history_size']}: "
+                               f"p95 {before['p95_ms']}ms -> {row['p95_ms']}ms")
+        if row["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{row['scenario']} c={row['concurrency']} h={row['history_size']}: "
+                               f"rps {before['rps']} -> {row['rps']}")
+    return regressions
+
+
+async def main_async(args):
+    app_module, storage = build_app(args)
+    # Per-request JSON logs would dominate the output
+    logging.getLogger("sre_agent").setLevel(logging.WARNING)
+    users = [f"bench-user-{i}" for i in range(args.users)]
+    results = []
+    try:
+        for history_size in args.history_sizes:
+            for concurrency in args.concurrency:
+                for scenario in args.scenarios:
+                    # Let queued write-behind appends land before reseeding
+                    for user_id in list(app_module.agent.history_writer.pending):
+                        await app_module.agent.history_writer.flush(user_id)
+                    seed_history(storage, users, history_size)
+                    row = await run_scenario(
+                        app_module.app, scenario, concurrency, args.requests, users, len(results)
+                    )
+                    row.update(scenario=scenario, concurrency=concurrency, history_size=history_size)
+                    results.append(row)
+                    print(f"{scenario:12s} c={concurrency:<4d} h={history_size:<4d} "
+                          f"rps={row['rps']:<9} p50={row['p50_ms']}ms p95={row['p95_ms']}ms "
+                          f"p99={row['p99_ms']}ms rss={row['peak_rss_mb']}MB errors={row['errors']}")
+    finally:
+        await app_module.agent.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the SRE agent API")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--history-sizes", nargs="+", type=int, default=[0, 50])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario run")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--output-tokens", type=int, default=400)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--backend", choices=("r2", "sqlite"), default="r2",
+                        help="History backend: R2Storage on the S3 stand-in, or SQLiteStorage on a temp file")
+    parser.add_argument("--s3-latency", type=float, default=0.02)
+    parser.add_argument("--flush-window", type=float, default=1.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fraction of LLM calls that fail with 503")
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="Fraction of LLM calls slowed down")
+    parser.add_argument("--llm-slow-latency", type=float, default=2.0, help="Extra seconds for a slowed LLM call")
+    parser.add_argument("--s3-error-rate", type=float, default=0.0, help="Fraction of S3 calls that fail with 503")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed regression vs. baseline")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,81 @@
-from typing import TypedDict, Optional, List, Dict, Any
-from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
-from langchain_core.messages import SystemMessage, HumanMessage
+from typing import Optional, List, Dict, Any, AsyncIterator
 import os
-from dotenv import load_dotenv
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 import hashlib
-from src.prompts import SYSTEM_PROMPT
-from src.storage_helper import R2Storage
+from src.prompts import SYSTEM_PROMPT, SUMMARY_PROMPT
+from src.context_builder import ContextBuilder, count_tokens
+from src.observability import stage, log_error, record_llm_usage, CACHE_EVENTS
+from src.storage_base import HistoryStorage
+from src.storage_helper import build_storage
+from src.history_writer import HistoryWriter
+from src.response_cache import ResponseCache, SingleFlight, response_cache_key
+from src.resilience import DependencyPolicy, DependencyError, LatencyTracker, RetryBudget, hedged, detach_deadline
 
-load_dotenv()
+ERROR_RESPONSE = "I apologize, but I'm having trouble processing your request right now. Please try again."
 
-class AgentState(TypedDict):
-    messages: list
+def message_classes():
+    """langchain_core.messages, imported on first use: it takes a few hundred ms to import"""
+    from langchain_core.messages import SystemMessage, HumanMessage
+    return SystemMessage, HumanMessage
+
+def load_chat_model(model_name: str):
+    from langchain.chat_models import init_chat_model
+    return init_chat_model(model_name, temperature=0.1)
 
 class AI_Agent:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, llm=None, storage: Optional[HistoryStorage] = None):
         self.api_key = api_key
-        # Use init_chat_model or direct ChatGoogleGenerativeAI
-        self.llm = init_chat_model(os.getenv("LLM_MODEL", "google-genai"), temperature=0.1)
+        # Use init_chat_model or direct ChatGoogleGenerativeAI; a prebuilt model can be injected
+        self.model_name = os.getenv("LLM_MODEL", "google-genai")
+        self.llm = llm or load_chat_model(self.model_name)
         self.system_prompt = SYSTEM_PROMPT
-        self.storage = R2Storage("sre-agent")
+        self.prompt_version = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+        self.storage = storage or build_storage("sre-agent")
+        # History appends are queued and written behind the request path
+        self.history_writer = HistoryWriter(
+            self.storage,
+            flush_window=float(os.getenv("HISTORY_FLUSH_WINDOW_SECONDS", "1.0")),
+            max_attempts=int(os.getenv("HISTORY_FLUSH_MAX_ATTEMPTS", "5"))
+        )
+        # Context-free answers are cached and identical in-flight calls coalesced
+        self.response_cache = ResponseCache(
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "500")),
+            max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(20 * 1024 * 1024))),
+            ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400")),
+            path=os.getenv("RESPONSE_CACHE_PATH") or None
+        )
+        self.single_flight = SingleFlight()
+        # Recent turns packed to a token budget, older turns kept as a rolling summary
+        self.context_builder = ContextBuilder(
+            token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500")),
+            max_turn_tokens=int(os.getenv("CONTEXT_MAX_TURN_TOKENS", "400")),
+            summary_words=int(os.getenv("CONTEXT_SUMMARY_WORDS", "200"))
+        )
+        # Strong references to fire-and-forget tasks (e.g. summary updates)
+        self.background_tasks = set()
+        # Default cap on concurrent LLM calls for one batch request
+        self.batch_concurrency = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+        # Timeouts, retries and a circuit breaker around every LLM call
+        self.llm_policy = DependencyPolicy(
+            "llm",
+            timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "30")),
+            max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "2")),
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+            budget=RetryBudget(ratio=float(os.getenv("RETRY_BUDGET_RATIO", "0.2")))
+        )
+        # Optional hedging: a second request once the first outlasts this latency percentile
+        self.hedge_percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+        self.llm_latency = LatencyTracker()
+
+    def warm_up(self):
+        """Import the message classes and prime the storage connection pool, so the first
+        request pays for neither the imports nor the TLS handshake"""
+        message_classes()
+        self.storage.warm_up()
 
     def get_response(self, user_message: str, user_id: Optional[str] = None) -> str:
         try:
@@ -28,13 +83,10 @@ class AI_Agent:
             if user_id:
                 context = self.get_chat_context(user_id)
             
-            enhanced_prompt = self.build_contextual_prompt(user_message, context)
-            
-            messages = [
-                SystemMessage(content=self.system_prompt),
-                HumanMessage(content=enhanced_prompt)
-            ]
-            response = self.llm(messages)
+            messages = self.build_messages(user_message, context)
+            with stage("llm"):
+                response = self.llm_policy.call(lambda: self.llm.invoke(messages))
+            record_llm_usage(response, self.count_prompt_tokens(messages), response.content)
             
             if user_id:
                 self.save_chat_history(user_id, user_message, response.content)
@@ -42,24 +94,246 @@ class AI_Agent:
             return response.content
             
         except Exception as e:
-            print(f"Error generating response: {e}")
-            return "I apologize, but I'm having trouble processing your request right now. Please try again."
+            log_error("generate_response_failed", e, user_id=user_id)
+            return ERROR_RESPONSE
 
-    def get_chat_context(self, user_id: str) -> str:
+    async def aget_response(self, user_message: str, user_id: Optional[str] = None) -> str:
+        """Async variant of get_response that never blocks the event loop"""
         try:
-            conversations = self.storage.get_history(user_id)
-            recent_conversations = conversations[-5:]
+            context = ""
+            if user_id:
+                context = await self.aget_chat_context(user_id)
+            
+            messages = self.build_messages(user_message, context)
+            if context or not self.response_cache.enabled:
+                content = await self.ainvoke_llm(messages)
+            else:
+                content = await self.aget_cached_completion(user_message, messages)
             
-            if recent_conversations:
-                context_parts = []
-                for conv in recent_conversations:
-                    context_parts.append(f"Previous User: {conv['user_message']}")
-                    context_parts.append(f"Previous Assistant: {conv['bot_response'][:200]}...")
-                return "\n".join(context_parts)
+            if user_id:
+                self.queue_chat_history(user_id, user_message, content)
+            
+            return content
+            
+        except DependencyError:
+            # Open breaker or spent deadline: let the caller answer 503/504 instead of an apology
+            raise
         except Exception as e:
-            print(f"Error getting chat context: {e}")
+            log_error("generate_response_failed", e, user_id=user_id)
+            return ERROR_RESPONSE
+
+    def get_responses(self, user_messages: List[str], user_id: Optional[str] = None,
+                      max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Answer several messages concurrently; results are in input order, failures reported per item"""
+        context = self.get_chat_context(user_id) if user_id else ""
+        
+        def answer(index):
+            try:
+                messages = self.build_messages(user_messages[index], context)
+                with stage("llm"):
+                    response = self.llm_policy.call(lambda: self.llm.invoke(messages))
+                record_llm_usage(response, self.count_prompt_tokens(messages), response.content)
+                return {"index": index, "response": response.content}
+            except Exception as e:
+                log_error("batch_item_failed", e, user_id=user_id, index=index)
+                return {"index": index, "error": str(e)}
+        
+        with ThreadPoolExecutor(max_workers=max_concurrency or self.batch_concurrency) as executor:
+            results = list(executor.map(answer, range(len(user_messages))))
+        
+        if user_id:
+            self.storage.append_history(user_id, self.build_batch_entries(user_messages, results))
+        return results
+
+    async def aget_responses(self, user_messages: List[str], user_id: Optional[str] = None,
+                             max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = [None] * len(user_messages)
+        async for index, result in self.aiter_responses(user_messages, user_id, max_concurrency):
+            results[index] = result
+        return results
+
+    async def aiter_responses(self, user_messages: List[str], user_id: Optional[str] = None,
+                              max_concurrency: Optional[int] = None):
+        """Yield (index, result) as each message completes, running at most max_concurrency LLM calls.
+
+        The user's context is built once for the whole batch, and all answered
+        turns are queued for history together, so they go out as one write.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.batch_concurrency)
+        context = await self.aget_chat_context(user_id) if user_id else ""
+        results = [None] * len(user_messages)
+        
+        async def answer(index):
+            async with semaphore:
+                try:
+                    messages = self.build_messages(user_messages[index], context)
+                    if context or not self.response_cache.enabled:
+                        content = await self.ainvoke_llm(messages)
+                    else:
+                        content = await self.aget_cached_completion(user_messages[index], messages)
+                    return index, {"index": index, "response": content}
+                except Exception as e:
+                    log_error("batch_item_failed", e, user_id=user_id, index=index)
+                    return index, {"index": index, "error": str(e)}
+        
+        tasks = [asyncio.create_task(answer(index)) for index in range(len(user_messages))]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, result = await next_done
+                results[index] = result
+                yield index, result
+        finally:
+            for task in tasks:
+                task.cancel()
+            if user_id:
+                self.history_writer.extend(user_id, self.build_batch_entries(user_messages, results))
+
+    def build_batch_entries(self, user_messages: List[str], results: List[Optional[Dict[str, Any]]]):
+        """History entries for the answered items, in input order with strictly increasing timestamps"""
+        now = datetime.now(timezone.utc)
+        return [
+            self.build_history_entry(user_messages[index], result["response"], now + timedelta(microseconds=index))
+            for index, result in enumerate(results)
+            if result and "response" in result
+        ]
+
+    async def ainvoke_llm(self, messages: list, stage_name: str = "llm") -> str:
+        with stage(stage_name):
+            response = await self.llm_policy.acall(lambda: self.ainvoke_hedged(messages))
+        record_llm_usage(response, self.count_prompt_tokens(messages), response.content)
+        return response.content
+
+    async def ainvoke_hedged(self, messages: list):
+        """One LLM attempt, hedged with a second request if it runs past the latency percentile"""
+        started = time.perf_counter()
+        delay = self.llm_latency.percentile(self.hedge_percentile) if self.hedge_percentile else None
+        response = await hedged(lambda: self.llm.ainvoke(messages), delay, self.llm_policy.budget)
+        self.llm_latency.record(time.perf_counter() - started)
+        return response
+
+    def count_prompt_tokens(self, messages: list) -> int:
+        return sum(count_tokens(message.content) for message in messages)
+
+    async def astream_response(self, user_message: str, user_id: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield response chunks as the LLM produces them; history is saved after the last chunk"""
+        context = ""
+        if user_id:
+            context = await self.aget_chat_context(user_id)
+        
+        messages = self.build_messages(user_message, context)
+        cacheable = not context and self.response_cache.enabled
+        cache_key = response_cache_key(user_message, self.prompt_version, self.model_name)
+        cached = await self._response_cache_call(self.response_cache.get, cache_key) if cacheable else None
+        
+        if cached is not None:
+            CACHE_EVENTS.labels("response", "hit").inc()
+            chunks = [cached]
+            yield cached
+        else:
+            if cacheable:
+                CACHE_EVENTS.labels("response", "miss").inc()
+            chunks = []
+            usage_chunk = None
+            started = time.perf_counter()
+            with stage("llm_stream"):
+                async for chunk in self.llm_policy.astream(lambda: self.llm.astream(messages)):
+                    if getattr(chunk, "usage_metadata", None):
+                        usage_chunk = chunk
+                    if chunk.content:
+                        chunks.append(chunk.content)
+                        yield chunk.content
+            record_llm_usage(usage_chunk, self.count_prompt_tokens(messages), "".join(chunks))
+            if cacheable:
+                await self._response_cache_call(
+                    self.response_cache.put, cache_key, "".join(chunks), time.perf_counter() - started
+                )
+        
+        if user_id:
+            # Queued for write-behind so the client is not kept waiting on R2
+            self.queue_chat_history(user_id, user_message, "".join(chunks))
+
+    async def aget_cached_completion(self, user_message: str, messages: list) -> str:
+        """Serve a context-free question from the response cache, coalescing identical misses"""
+        key = response_cache_key(user_message, self.prompt_version, self.model_name)
+        cached = await self._response_cache_call(self.response_cache.get, key)
+        if cached is not None:
+            CACHE_EVENTS.labels("response", "hit").inc()
+            return cached
+        
+        async def complete():
+            started = time.perf_counter()
+            content = await self.ainvoke_llm(messages)
+            await self._response_cache_call(
+                self.response_cache.put, key, content, time.perf_counter() - started
+            )
+            return content
+        
+        coalesced = key in self.single_flight.inflight
+        CACHE_EVENTS.labels("response", "coalesced" if coalesced else "miss").inc()
+        return await self.single_flight.do(key, complete)
+
+    async def _response_cache_call(self, func, *args):
+        # The on-disk backend does SQLite I/O, so keep it off the event loop
+        if self.response_cache.path:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    def build_messages(self, user_message: str, context: str) -> list:
+        enhanced_prompt = self.build_contextual_prompt(user_message, context)
+        SystemMessage, HumanMessage = message_classes()
+        return [
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=enhanced_prompt)
+        ]
+
+    def get_chat_context(self, user_id: str) -> str:
+        try:
+            with stage("context"):
+                context, _ = self.context_builder.build(user_id, self.storage.get_context_history(user_id))
+            return context
+        except Exception as e:
+            log_error("chat_context_failed", e, user_id=user_id)
         return ""
 
+    async def aget_chat_context(self, user_id: str) -> str:
+        try:
+            with stage("context"):
+                context, overflow = self.context_builder.build(user_id, await self.aload_history(user_id))
+            generation = self.context_builder.claim_update(user_id) if overflow else None
+            if generation is not None:
+                # Fold turns that left the window into the summary without delaying this request
+                self.run_in_background(self.aupdate_summary(user_id, overflow, generation))
+            return context
+        except Exception as e:
+            log_error("chat_context_failed", e, user_id=user_id)
+        return ""
+
+    async def aupdate_summary(self, user_id: str, turns: List[Dict[str, Any]], generation: int):
+        # Runs after the request that triggered it, so it is not bound by that request's deadline
+        detach_deadline()
+        try:
+            summary, _ = self.context_builder.get_summary(user_id)
+            prompt = SUMMARY_PROMPT.format(
+                max_words=self.context_builder.summary_words,
+                summary=summary or "(none yet)",
+                turns="\n".join(self.context_builder.render_turn(conv) for conv in turns)
+            )
+            _, HumanMessage = message_classes()
+            summary = await self.ainvoke_llm([HumanMessage(content=prompt)], stage_name="llm_summary")
+            self.context_builder.set_summary(
+                user_id, summary.strip(), turns[-1].get('timestamp', ''), generation
+            )
+        except Exception as e:
+            log_error("chat_summary_failed", e, user_id=user_id)
+        finally:
+            self.context_builder.release_update(user_id, generation)
+
+    def run_in_background(self, coro):
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
     def build_contextual_prompt(self, user_message: str, context: str) -> str:
         if context:
             return f"Context:\n{context}\n\nCurrent user message: {user_message}"
@@ -67,15 +341,34 @@ class AI_Agent:
 
     def save_chat_history(self, user_id: str, user_message: str, bot_response: str):
         try:
-            history = self.storage.get_history(user_id)
-            history.append({
-                'user_message': user_message,
-                'bot_response': bot_response,
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            })
-            self.storage.save_history(user_id, history)
+            self.storage.append_history(user_id, [self.build_history_entry(user_message, bot_response)])
         except Exception as e:
-            print(f"Error saving chat history: {e}")
+            log_error("save_chat_history_failed", e, user_id=user_id)
+
+    def queue_chat_history(self, user_id: str, user_message: str, bot_response: str):
+        """Queue a turn for write-behind persistence (must be called on the event loop)"""
+        self.history_writer.append(user_id, self.build_history_entry(user_message, bot_response))
+
+    async def aload_history(self, user_id: str) -> List[Dict[str, Any]]:
+        """Stored history (possibly stale while storage is failing) plus turns still queued for write-behind"""
+        history = await self.storage.aget_context_history(user_id)
+        saved = {conv.get('timestamp') for conv in history}
+        history.extend(
+            conv for conv in self.history_writer.pending_entries(user_id)
+            if conv['timestamp'] not in saved
+        )
+        return history
+
+    def build_history_entry(self, user_message: str, bot_response: str,
+                            timestamp: Optional[datetime] = None) -> Dict[str, Any]:
+        entry = {
+            'user_message': user_message,
+            'bot_response': bot_response,
+            'timestamp': (timestamp or datetime.now(timezone.utc)).isoformat()
+        }
+        # Count it now, while the response is at hand, for the next context build
+        self.context_builder.turn_tokens(entry)
+        return entry
 
     def get_chat_history(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
         try:
@@ -85,10 +378,81 @@ class AI_Agent:
         except Exception:
             return []
 
+    async def aget_chat_history(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        history, _ = await self.aget_chat_history_page(user_id, limit)
+        return history
+
+    async def aget_chat_history_page(self, user_id: str, limit: int = 20, cursor: Optional[str] = None):
+        """Return (entries newest first, next_cursor); pass next_cursor back to get the following page.
+
+        Storage errors are raised: an empty page would read as "no history".
+        """
+        page, next_cursor = await self.storage.aget_page(user_id, limit, cursor)
+        # Entries written by earlier versions carry a cached token count that is not for clients
+        page = [{key: value for key, value in conv.items() if key != 'tokens'} for conv in page]
+        pending = [
+            conv for conv in self.history_writer.pending_entries(user_id)
+            if not cursor or conv['timestamp'] < cursor
+        ]
+        if not pending:
+            return page, next_cursor
+        # Turns still queued for write-behind are the newest, so they lead the page
+        saved = {conv.get('timestamp') for conv in page}
+        merged = sorted(
+            page + [conv for conv in pending if conv['timestamp'] not in saved],
+            key=lambda x: x.get('timestamp', ''),
+            reverse=True
+        )
+        if len(merged) > limit:
+            next_cursor = merged[limit - 1].get('timestamp')
+        return merged[:limit], next_cursor
+
+    async def aget_history_version(self, user_id: str) -> Optional[str]:
+        """Version of what aget_chat_history_page would return: the stored version plus queued turns.
+
+        Storage errors are raised, so a failing read never gets an ETag.
+        """
+        version = await self.storage.aget_version(user_id)
+        pending = self.history_writer.pending_entries(user_id)
+        if version is not None and pending:
+            version = f"{version}+{len(pending)}@{pending[-1]['timestamp']}"
+        return version
+
     def delete_chat_history(self, user_id: str):
-        self.storage.delete_history(user_id)
+        try:
+            self.storage.delete_history(user_id)
+        finally:
+            self.context_builder.forget(user_id)
+
+    async def adelete_chat_history(self, user_id: str):
+        try:
+            await self.history_writer.delete(user_id)
+        finally:
+            # The summary was built from the deleted turns; forgetting it after the delete
+            # also revokes any update that read them while the delete was running
+            self.context_builder.forget(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        response_cache = self.response_cache.stats()
+        response_cache["coalesced"] = self.single_flight.coalesced
+        return {
+            "response_cache": response_cache,
+            "history_writer": self.history_writer.stats(),
+            "llm": self.llm_policy.stats(),
+            **self.storage.stats(),
+        }
+
+    async def aclose(self):
+        """Flush queued history writes, then release the storage executor"""
+        try:
+            await self.history_writer.close()
+        finally:
+            self.storage.close()
+            self.response_cache.close()
 
 def main():
+    from dotenv import load_dotenv
+    load_dotenv()
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         print("GOOGLE_API_KEY not found.")
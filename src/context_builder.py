@@ -0,0 +1,125 @@
+import re
+import html
+import threading
+from collections import OrderedDict
+
+
+def count_tokens(text):
+    """Cheap token estimate (~4 characters per token) that needs no tokenizer or API call"""
+    return max(1, len(text) // 4)
+
+
+def to_plain_text(markup):
+    """Strip HTML so truncation never lands mid-tag"""
+    text = re.sub(r"<[^>]+>", " ", markup)
+    return " ".join(html.unescape(text).split())
+
+
+def truncate_to_tokens(text, max_tokens):
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+class ContextBuilder:
+    """Builds the prompt context from stored history within a token budget.
+
+    The most recent turns are packed newest-first until the budget is used;
+    turns that no longer fit are folded into a per-user rolling summary,
+    which is updated incrementally with only the turns that fell out of the
+    window since the last update. Each update claims a generation number; an
+    update whose claim was revoked by `forget` (history deleted) is discarded.
+    """
+
+    def __init__(self, token_budget=1500, max_turn_tokens=400, summary_words=200, max_users=1000,
+                 max_cached_turns=50000):
+        self.token_budget = token_budget
+        self.max_turn_tokens = max_turn_tokens
+        self.summary_words = summary_words
+        self.max_users = max_users
+        self.summaries = OrderedDict()  # user_id -> (summary, summarized_through timestamp)
+        self.max_cached_turns = max_cached_turns
+        self.turn_token_counts = OrderedDict()  # hash of a turn -> its rendered token count
+        self.updating = {}  # user_id -> generation of the update in flight
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def render_turn(self, conv):
+        response = truncate_to_tokens(to_plain_text(conv['bot_response']), self.max_turn_tokens)
+        return f"Previous User: {conv['user_message']}\nPrevious Assistant: {response}"
+
+    def turn_tokens(self, conv):
+        # Counted once per turn; cached here rather than on the entry, which is stored and served
+        key = hash((conv.get('timestamp', ''), conv['user_message'], conv['bot_response']))
+        with self.lock:
+            if key in self.turn_token_counts:
+                self.turn_token_counts.move_to_end(key)
+                return self.turn_token_counts[key]
+        tokens = count_tokens(self.render_turn(conv))
+        with self.lock:
+            self.turn_token_counts[key] = tokens
+            while len(self.turn_token_counts) > self.max_cached_turns:
+                self.turn_token_counts.popitem(last=False)
+        return tokens
+
+    def get_summary(self, user_id):
+        with self.lock:
+            if user_id in self.summaries:
+                self.summaries.move_to_end(user_id)
+                return self.summaries[user_id]
+            return "", ""
+
+    def set_summary(self, user_id, summary, summarized_through, generation=None):
+        with self.lock:
+            if generation is not None and self.updating.get(user_id) != generation:
+                # The history was deleted while this summary was being written
+                return False
+            self.summaries[user_id] = (summary, summarized_through)
+            self.summaries.move_to_end(user_id)
+            while len(self.summaries) > self.max_users:
+                self.summaries.popitem(last=False)
+            return True
+
+    def forget(self, user_id):
+        """Drop a user's summary and revoke any update in flight, e.g. when their history is deleted"""
+        with self.lock:
+            self.summaries.pop(user_id, None)
+            self.updating.pop(user_id, None)
+
+    def build(self, user_id, conversations):
+        """Return (context, overflow) where overflow lists unsummarized turns outside the window"""
+        summary, summarized_through = self.get_summary(user_id)
+        budget = self.token_budget - (count_tokens(summary) if summary else 0)
+        window = []
+        for conv in reversed(conversations):
+            tokens = self.turn_tokens(conv)
+            if tokens > budget:
+                break
+            budget -= tokens
+            window.append(conv)
+        window.reverse()
+        
+        older = conversations[:len(conversations) - len(window)]
+        overflow = [conv for conv in older if conv.get('timestamp', '') > summarized_through]
+        
+        context_parts = []
+        if summary:
+            context_parts.append(f"Summary of earlier conversation: {summary}")
+        context_parts.extend(self.render_turn(conv) for conv in window)
+        return "\n".join(context_parts), overflow
+
+    def claim_update(self, user_id):
+        """Ensure only one summary update per user runs at a time; returns its generation, or None"""
+        with self.lock:
+            if user_id in self.updating:
+                return None
+            self.generation += 1
+            self.updating[user_id] = self.generation
+            return self.generation
+
+    def release_update(self, user_id, generation):
+        with self.lock:
+            # Only our own claim: after forget() a newer update may hold it
+            if self.updating.get(user_id) == generation:
+                del self.updating[user_id]
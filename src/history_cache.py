@@ -0,0 +1,68 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class HistoryCache:
+    """Size-bounded LRU cache of user histories, keyed by user_id.
+
+    Each entry remembers the S3 ETag of the object it was loaded from so a
+    stale entry can be revalidated with a conditional GET instead of a full
+    download. Access is guarded by a lock because storage calls run on a
+    thread pool.
+    """
+
+    def __init__(self, max_users=1000, ttl_seconds=300):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # user_id -> (history, etag, cached_at)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def get(self, user_id):
+        """Return (history, etag, fresh) for a cached user, or None on a miss"""
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(user_id)
+            history, etag, cached_at = entry
+            fresh = time.monotonic() - cached_at < self.ttl_seconds
+            if fresh:
+                self.hits += 1
+            return list(history), etag, fresh
+
+    def put(self, user_id, history, etag=None):
+        with self.lock:
+            self.entries[user_id] = (list(history), etag, time.monotonic())
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_users:
+                self.entries.popitem(last=False)
+
+    def touch(self, user_id):
+        """Mark an entry fresh again after the server confirmed it is unchanged (304)"""
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None:
+                self.revalidations += 1
+                self.entries[user_id] = (entry[0], entry[1], time.monotonic())
+
+    def record_miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "size": len(self.entries),
+            }
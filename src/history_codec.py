@@ -0,0 +1,71 @@
+"""Versioned on-the-wire format for stored chat histories.
+
+Layout: MAGIC (4 bytes) + codec id (1 byte) + payload, where the payload is
+the serialized history, optionally compressed. Objects written before this
+format existed are plain JSON arrays; they are still read transparently and
+get rewritten in the new format the next time the history is saved.
+"""
+import os
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b"SRH1"
+CODEC_IDS = {"none": 0, "gzip": 1, "zstd": 2}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+CONTENT_TYPE = "application/x-sre-history"
+
+
+def default_codec():
+    codec = os.getenv("HISTORY_COMPRESSION", "zstd" if zstandard else "gzip")
+    if codec == "zstd" and not zstandard:
+        return "gzip"
+    return codec
+
+
+def dumps(history):
+    if orjson:
+        return orjson.dumps(history, default=str)
+    return json.dumps(history, default=str, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_history(history, codec=None):
+    codec = codec or default_codec()
+    payload = dumps(history)
+    if codec == "zstd":
+        payload = zstandard.ZstdCompressor(level=3).compress(payload)
+    elif codec == "gzip":
+        payload = gzip.compress(payload, compresslevel=6)
+    return MAGIC + bytes([CODEC_IDS[codec]]) + payload
+
+
+def decode_history(body):
+    if not body.startswith(MAGIC):
+        # Legacy object: uncompressed JSON from before the versioned format
+        return loads(body)
+    codec = CODEC_NAMES.get(body[len(MAGIC)])
+    payload = body[len(MAGIC) + 1:]
+    if codec == "zstd":
+        if not zstandard:
+            raise RuntimeError("History is zstd-compressed but the zstandard package is not installed")
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    elif codec == "gzip":
+        payload = gzip.decompress(payload)
+    elif codec is None:
+        raise ValueError(f"Unknown history codec id {body[len(MAGIC)]}")
+    return loads(payload)
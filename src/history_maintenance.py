@@ -0,0 +1,256 @@
+"""Retention and compaction for the chat histories stored under agents_history/{app}/.
+
+A pass streams over the prefix one `list_objects_v2` page at a time, so
+memory stays constant however many users there are. Objects not written
+for `idle_days` are deleted in `delete_objects` batches, flushed at the end of
+every page; each delete carries the ETag the object was listed with, so a
+history written since the listing is kept. Objects larger than
+`compact_bytes` are trimmed to the retention limit and rewritten in the
+current compressed format, with a conditional PUT so a concurrent chat turn
+is never overwritten. All R2 calls are paced to `ops_per_second` and go
+through the worker's own retry policy and breaker, so maintenance failures
+never open the breaker guarding request traffic; a pass stops early if
+either breaker opens, so maintenance yields to request traffic.
+
+Runs in-process on a schedule (HISTORY_MAINTENANCE_INTERVAL_SECONDS), or
+once from the command line:
+
+    python -m src.history_maintenance --dry-run
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from datetime import datetime, timezone, timedelta
+from botocore.exceptions import ClientError
+from src.history_codec import encode_history, decode_history
+from src.resilience import DependencyPolicy
+from src.observability import (
+    log_event, log_error, MAINTENANCE_OBJECTS, MAINTENANCE_BYTES_RECLAIMED, MAINTENANCE_LAST_RUN
+)
+
+
+class Pacer:
+    """Spaces out operations to at most `rate` per second (0 disables pacing)"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_at = 0.0
+
+    def wait(self, cost=1):
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval * cost
+
+
+class HistoryMaintenance:
+    def __init__(self, storage, idle_days=90.0, compact_bytes=256 * 1024, ops_per_second=10.0,
+                 page_size=1000, delete_batch=1000, dry_run=False, progress_every=1000):
+        self.storage = storage
+        self.idle_days = idle_days
+        self.compact_bytes = compact_bytes
+        self.pacer = Pacer(ops_per_second)
+        self.page_size = page_size
+        self.delete_batch = min(delete_batch, 1000)  # S3 DeleteObjects limit
+        self.dry_run = dry_run
+        self.progress_every = progress_every
+        self.mode = "dry_run" if dry_run else "live"
+        self.stopping = threading.Event()
+        # Separate from storage.policy: request traffic's breaker is only read, never fed
+        self.policy = DependencyPolicy("r2_maintenance", failure_threshold=3, reset_timeout=60.0)
+
+    @property
+    def prefix(self):
+        return f"agents_history/{self.storage.app_name}/"
+
+    def user_id_for(self, key):
+        return key[len(self.prefix):].rsplit(".json", 1)[0]
+
+    def iter_pages(self):
+        """Yield the objects under the prefix a listing page at a time; only one page is held at a time"""
+        params = {"Bucket": self.storage.bucket_name, "Prefix": self.prefix, "MaxKeys": self.page_size}
+        while True:
+            self.pacer.wait()
+            page = self.policy.call(lambda: self.storage.s3.list_objects_v2(**params))
+            yield page.get("Contents", [])
+            if not page.get("IsTruncated"):
+                return
+            params["ContinuationToken"] = page["NextContinuationToken"]
+
+    def should_stop(self):
+        return (self.stopping.is_set() or self.storage.policy.breaker.state != "closed"
+                or self.policy.breaker.state != "closed")
+
+    def run_once(self):
+        """One pass over the prefix; returns a summary of what was (or, in dry-run, would be) done"""
+        summary = {"dry_run": self.dry_run, "scanned": 0, "deleted": 0, "compacted": 0,
+                   "bytes_reclaimed": 0, "errors": 0, "stopped_early": False}
+        if not self.storage.s3:
+            return summary
+        started = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.idle_days)
+        idle = []
+        log_event("history_maintenance_started", mode=self.mode, idle_days=self.idle_days)
+        try:
+            for page in self.iter_pages():
+                for obj in page:
+                    if self.should_stop():
+                        summary["stopped_early"] = True
+                        break
+                    summary["scanned"] += 1
+                    MAINTENANCE_OBJECTS.labels("scanned", self.mode).inc()
+                    if obj["LastModified"] < cutoff:
+                        idle.append(obj)
+                        if len(idle) >= self.delete_batch:
+                            self.delete_idle(idle, summary)
+                            idle = []
+                    elif obj.get("Size", 0) > self.compact_bytes:
+                        self.compact(obj, summary)
+                    if summary["scanned"] % self.progress_every == 0:
+                        log_event("history_maintenance_progress", **summary)
+                if summary["stopped_early"]:
+                    # Left for the next pass, which lists them again
+                    break
+                # Deleted while the listing is fresh rather than carried over to later pages
+                if idle:
+                    self.delete_idle(idle, summary)
+                    idle = []
+        except Exception as e:
+            summary["errors"] += 1
+            log_error("history_maintenance_failed", e)
+        summary["duration_seconds"] = round(time.monotonic() - started, 2)
+        MAINTENANCE_LAST_RUN.set(time.time())
+        log_event("history_maintenance_finished", **summary)
+        return summary
+
+    def delete_idle(self, objects, summary):
+        size = sum(obj.get("Size", 0) for obj in objects)
+        if not self.dry_run:
+            self.pacer.wait()
+            try:
+                # The listed ETag makes each delete conditional: a history written since is kept
+                response = self.policy.call(lambda: self.storage.s3.delete_objects(
+                    Bucket=self.storage.bucket_name,
+                    Delete={"Objects": [{"Key": obj["Key"], "ETag": obj["ETag"]} for obj in objects],
+                            "Quiet": True}
+                ))
+            except Exception as e:
+                summary["errors"] += 1
+                MAINTENANCE_OBJECTS.labels("failed", self.mode).inc(len(objects))
+                log_error("history_maintenance_delete_failed", e, objects=len(objects))
+                return
+            errors = response.get("Errors", [])
+            # Written or deleted by a request since it was listed
+            changed = {error["Key"] for error in errors if error.get("Code") in ("PreconditionFailed", "NoSuchKey")}
+            failed = {error["Key"] for error in errors} - changed
+            if changed:
+                MAINTENANCE_OBJECTS.labels("skipped", self.mode).inc(len(changed))
+            if failed:
+                summary["errors"] += len(failed)
+                MAINTENANCE_OBJECTS.labels("failed", self.mode).inc(len(failed))
+            if errors:
+                objects = [obj for obj in objects if obj["Key"] not in changed | failed]
+                size = sum(obj.get("Size", 0) for obj in objects)
+            for obj in objects:
+                self.storage.cache.invalidate(self.user_id_for(obj["Key"]))
+        summary["deleted"] += len(objects)
+        summary["bytes_reclaimed"] += size
+        MAINTENANCE_OBJECTS.labels("deleted", self.mode).inc(len(objects))
+        MAINTENANCE_BYTES_RECLAIMED.labels(self.mode).inc(size)
+
+    def compact(self, obj, summary):
+        """Trim to the retention limit and rewrite in the current format, if that makes it smaller"""
+        user_id = self.user_id_for(obj["Key"])
+        try:
+            self.pacer.wait()
+            response = self.policy.call(lambda: self.storage.s3.get_object(
+                Bucket=self.storage.bucket_name, Key=obj["Key"]
+            ))
+            body = response["Body"].read()
+            history = decode_history(body)[-self.storage.max_entries:]
+            reclaimed = len(body) - len(encode_history(history))
+            if reclaimed <= 0:
+                MAINTENANCE_OBJECTS.labels("skipped", self.mode).inc()
+                return
+            if not self.dry_run:
+                self.pacer.wait()
+                # If-Match: a turn appended since the GET wins, and the next pass retries
+                self.storage.put_history_if_match(user_id, history, response["ETag"], policy=self.policy)
+        except ClientError as e:
+            status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+            if status in (404, 409, 412):
+                # Deleted or written by a request since it was listed
+                MAINTENANCE_OBJECTS.labels("skipped", self.mode).inc()
+                return
+            summary["errors"] += 1
+            MAINTENANCE_OBJECTS.labels("failed", self.mode).inc()
+            log_error("history_maintenance_compact_failed", e, user_id=user_id)
+            return
+        except Exception as e:
+            summary["errors"] += 1
+            MAINTENANCE_OBJECTS.labels("failed", self.mode).inc()
+            log_error("history_maintenance_compact_failed", e, user_id=user_id)
+            return
+        summary["compacted"] += 1
+        summary["bytes_reclaimed"] += reclaimed
+        MAINTENANCE_OBJECTS.labels("compacted", self.mode).inc()
+        MAINTENANCE_BYTES_RECLAIMED.labels(self.mode).inc(reclaimed)
+
+    async def run_forever(self, interval):
+        """Run a pass every `interval` seconds in a worker thread, starting at a random offset
+        so several replicas don't all list the bucket at the same moment"""
+        try:
+            await asyncio.sleep(random.uniform(0, interval))
+            while True:
+                await asyncio.to_thread(self.run_once)
+                await asyncio.sleep(interval)
+        finally:
+            # A pass still running in its thread stops at the next object
+            self.stopping.set()
+
+
+def build_maintenance(storage, dry_run=None):
+    """HistoryMaintenance configured from HISTORY_RETENTION_* / HISTORY_MAINTENANCE_* settings"""
+    return HistoryMaintenance(
+        storage,
+        idle_days=float(os.getenv("HISTORY_RETENTION_DAYS", "90")),
+        compact_bytes=int(os.getenv("HISTORY_COMPACT_BYTES", str(256 * 1024))),
+        ops_per_second=float(os.getenv("HISTORY_MAINTENANCE_OPS_PER_SECOND", "10")),
+        dry_run=os.getenv("HISTORY_MAINTENANCE_DRY_RUN", "false").lower() == "true" if dry_run is None else dry_run
+    )
+
+
+def main():
+    from dotenv import load_dotenv
+    from src.storage_helper import R2Storage
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Expire idle chat histories and compact oversized ones in R2")
+    parser.add_argument("--app-name", default="sre-agent")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    parser.add_argument("--idle-days", type=float, help="Delete histories not written for this long")
+    parser.add_argument("--compact-bytes", type=int, help="Compact histories larger than this")
+    parser.add_argument("--ops-per-second", type=float, help="Cap on R2 operations per second")
+    args = parser.parse_args()
+
+    storage = R2Storage(args.app_name)
+    if not storage.s3:
+        parser.error("R2 is not configured (R2_ENDPOINT, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY)")
+    maintenance = build_maintenance(storage, dry_run=args.dry_run)
+    if args.idle_days is not None:
+        maintenance.idle_days = args.idle_days
+    if args.compact_bytes is not None:
+        maintenance.compact_bytes = args.compact_bytes
+    if args.ops_per_second is not None:
+        maintenance.pacer = Pacer(args.ops_per_second)
+    try:
+        print(json.dumps(maintenance.run_once(), indent=2))
+    finally:
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
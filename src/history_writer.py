@@ -0,0 +1,124 @@
+import asyncio
+from collections import defaultdict
+from src.resilience import detach_deadline
+from src.observability import log_event, log_error
+
+
+class HistoryWriter:
+    """Write-behind persistence for chat history.
+
+    Appends are queued per user and written after `flush_window` seconds, so
+    several messages from the same user land in a single conditional PUT and
+    the request path never waits on R2. Each user has at most one flush in
+    flight, which keeps their entries in order. A failed write leaves the
+    entries queued and is retried with a doubling delay, up to `max_attempts`;
+    a storage error counts as a failed write.
+    """
+
+    def __init__(self, storage, flush_window=1.0, max_attempts=5):
+        self.storage = storage
+        self.flush_window = flush_window
+        self.max_attempts = max_attempts
+        self.attempts = {}  # user_id -> consecutive failed flushes
+        self.pending = defaultdict(list)
+        self.locks = defaultdict(asyncio.Lock)
+        self.flush_tasks = {}
+        self.closing = False
+        self.flushes = 0
+        self.entries_written = 0
+        self.failed_flushes = 0
+
+    def append(self, user_id, entry):
+        """Queue an entry; returns immediately"""
+        self.extend(user_id, [entry])
+
+    def extend(self, user_id, entries):
+        """Queue several entries so they go out in the same write"""
+        self.pending[user_id].extend(entries)
+        if self.closing:
+            return
+        if user_id not in self.flush_tasks:
+            self.flush_tasks[user_id] = asyncio.create_task(self._flush_later(user_id))
+
+    def pending_entries(self, user_id):
+        """Entries accepted for a user but not yet written to storage"""
+        return list(self.pending.get(user_id, []))
+
+    async def _flush_later(self, user_id):
+        # The flush outlives the request that queued it, so it must not inherit its deadline
+        detach_deadline()
+        await asyncio.sleep(self.flush_window * 2 ** self.attempts.get(user_id, 0))
+        try:
+            await self.flush(user_id)
+        finally:
+            self.flush_tasks.pop(user_id, None)
+        if self.pending.get(user_id) and not self.closing:
+            # Entries that arrived during the flush get their own window
+            self.flush_tasks[user_id] = asyncio.create_task(self._flush_later(user_id))
+        elif not self.locks[user_id].locked():
+            self.locks.pop(user_id, None)
+
+    async def flush(self, user_id):
+        async with self.locks[user_id]:
+            entries = self.pending_entries(user_id)
+            if not entries:
+                return
+            try:
+                saved = await self.storage.aappend_history(user_id, entries)
+            except Exception as e:
+                log_error("history_flush_error", e, user_id=user_id, entries=len(entries))
+                saved = False
+            self.flushes += 1
+            if saved:
+                self.entries_written += len(entries)
+                self.attempts.pop(user_id, None)
+            else:
+                self.failed_flushes += 1
+                attempts = self.attempts.get(user_id, 0) + 1
+                if attempts < self.max_attempts:
+                    # Keep the entries at the front of the queue for the next window
+                    self.attempts[user_id] = attempts
+                    log_event("history_flush_failed", user_id=user_id, entries=len(entries), attempt=attempts)
+                    return
+                self.attempts.pop(user_id, None)
+                log_error("history_flush_dropped", "write failed", user_id=user_id,
+                          entries=len(entries), attempts=attempts)
+            # Drop only what was written (or given up on); newer appends stay queued in order
+            del self.pending[user_id][:len(entries)]
+            if not self.pending[user_id]:
+                del self.pending[user_id]
+
+    async def delete(self, user_id):
+        """Drop queued entries for a user and delete their stored history"""
+        async with self.locks[user_id]:
+            self.pending.pop(user_id, None)
+            self.attempts.pop(user_id, None)
+            await self.storage.adelete_history(user_id)
+
+    async def close(self):
+        """Flush everything still queued; called on shutdown"""
+        self.closing = True
+        tasks = list(self.flush_tasks.items())
+        for user_id, task in tasks:
+            # A flush already writing must finish, or its entries would be written twice
+            if not self.locks[user_id].locked():
+                task.cancel()
+        await asyncio.gather(*(task for _, task in tasks), return_exceptions=True)
+        self.flush_tasks.clear()
+        for user_id in list(self.pending):
+            # One user's failure must not keep the others from being flushed
+            try:
+                await self.flush(user_id)
+            except Exception as e:
+                log_error("history_flush_error", e, user_id=user_id)
+        for user_id, entries in self.pending.items():
+            log_error("history_flush_dropped", "write failed at shutdown", user_id=user_id, entries=len(entries))
+
+    def stats(self):
+        return {
+            "pending_users": len(self.pending),
+            "pending_entries": sum(len(entries) for entries in self.pending.values()),
+            "flushes": self.flushes,
+            "entries_written": self.entries_written,
+            "failed_flushes": self.failed_flushes,
+        }
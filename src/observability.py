@@ -0,0 +1,136 @@
+import sys
+import json
+import time
+import uuid
+import logging
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from prometheus_client import Counter, Gauge, Histogram
+
+# Correlation data for the request being served; copied into tasks and executor threads
+request_id_var = contextvars.ContextVar("request_id", default="-")
+endpoint_var = contextvars.ContextVar("endpoint", default="background")
+
+STAGE_LATENCY = Histogram(
+    "sre_agent_stage_duration_seconds",
+    "Latency of each stage of request handling",
+    ["stage", "endpoint", "outcome"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60)
+)
+LLM_TOKENS = Counter(
+    "sre_agent_llm_tokens_total",
+    "LLM tokens sent (input) and received (output)",
+    ["direction"]
+)
+R2_BYTES = Counter(
+    "sre_agent_r2_bytes_total",
+    "Bytes read from and written to R2",
+    ["direction"]
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "sre_agent_rate_limit_rejections_total",
+    "Requests rejected by the rate limiter"
+)
+CACHE_EVENTS = Counter(
+    "sre_agent_cache_events_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"]
+)
+
+CIRCUIT_STATE = Gauge(
+    "sre_agent_circuit_breaker_state",
+    "Circuit breaker state per dependency (0 closed, 1 half-open, 2 open)",
+    ["dependency"]
+)
+CIRCUIT_REJECTIONS = Counter(
+    "sre_agent_circuit_breaker_rejections_total",
+    "Calls failed fast because the dependency's breaker was open",
+    ["dependency"]
+)
+DEPENDENCY_RETRIES = Counter(
+    "sre_agent_dependency_retries_total",
+    "Retries per dependency, and retries refused by the retry budget",
+    ["dependency", "result"]
+)
+LLM_HEDGES = Counter(
+    "sre_agent_llm_hedged_requests_total",
+    "Hedged second LLM requests, by which request won",
+    ["winner"]
+)
+DEADLINE_EXCEEDED = Counter(
+    "sre_agent_deadline_exceeded_total",
+    "Calls abandoned because the request deadline ran out",
+    ["dependency"]
+)
+
+MAINTENANCE_OBJECTS = Counter(
+    "sre_agent_history_maintenance_objects_total",
+    "History objects handled by the maintenance worker, by action and mode (live or dry_run)",
+    ["action", "mode"]
+)
+MAINTENANCE_BYTES_RECLAIMED = Counter(
+    "sre_agent_history_maintenance_bytes_reclaimed_total",
+    "Bytes removed from R2 by idle-user deletion and compaction",
+    ["mode"]
+)
+MAINTENANCE_LAST_RUN = Gauge(
+    "sre_agent_history_maintenance_last_run_timestamp_seconds",
+    "Unix time the last maintenance pass finished"
+)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            "request_id": request_id_var.get(),
+            "endpoint": endpoint_var.get(),
+        }
+        payload.update(getattr(record, "fields", {}))
+        return json.dumps(payload, default=str)
+
+
+logger = logging.getLogger("sre_agent")
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def log_event(event, level=logging.INFO, **fields):
+    """Emit one structured JSON log line tagged with the current request ID"""
+    logger.log(level, event, extra={"fields": fields})
+
+
+def log_error(event, error, **fields):
+    log_event(event, level=logging.ERROR, error=str(error), **fields)
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def stage(name):
+    """Time a block as a named stage, labelled by endpoint and outcome"""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        STAGE_LATENCY.labels(name, endpoint_var.get(), outcome).observe(time.perf_counter() - started)
+
+
+def record_llm_usage(message, prompt_tokens, completion_text):
+    """Count LLM tokens from the provider's usage metadata, falling back to an estimate"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    LLM_TOKENS.labels("input").inc(usage.get("input_tokens") or prompt_tokens)
+    LLM_TOKENS.labels("output").inc(usage.get("output_tokens") or max(1, len(completion_text) // 4))
@@ -136,4 +136,19 @@ Your goal is not just to provide correct technical implementations, but to build
 - Include practical examples and configuration snippets when explaining monitoring and alerting implementations.
 - Reference specific incidents or failure scenarios to illustrate reliability concepts and decision-making processes.
 """
-)
\ No newline at end of file
+)
+
+SUMMARY_PROMPT = (
+    """
+You maintain a running summary of a conversation between a user and an expert Site Reliability Engineer.
+Update the existing summary with the new turns below. Keep the user's name, their systems, tooling, constraints
+and goals, and the key recommendations already given. Drop pleasantries and repetition. Reply with plain text only
+(no HTML, no headings), in at most {max_words} words.
+
+Existing summary:
+{summary}
+
+New turns:
+{turns}
+"""
+)
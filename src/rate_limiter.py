@@ -0,0 +1,160 @@
+import time
+import sqlite3
+import asyncio
+import threading
+from src.observability import log_error
+
+
+class InMemoryBackend:
+    """Per-process counters: {key: (window_start, current_count, previous_count)}"""
+
+    blocking = False
+
+    def __init__(self):
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def hit(self, key, limit, window, now, cost=1):
+        return self.hit_all([key], limit, window, now, cost)
+
+    def hit_all(self, keys, limit, window, now, cost=1):
+        """Charge every key if all of them are under the limit, otherwise none"""
+        window_start = now - now % window
+        with self.lock:
+            counts = {}
+            for key in keys:
+                start, current, previous = self.counters.get(key, (window_start, 0, 0))
+                if start != window_start:
+                    # Roll the window; anything older than the previous window no longer counts
+                    previous = current if window_start - start == window else 0
+                    current = 0
+                counts[key] = (current, previous)
+            allowed = all(
+                sliding_count(previous, current, window_start, window, now) + cost - 1 < limit
+                for current, previous in counts.values()
+            )
+            for key, (current, previous) in counts.items():
+                self.counters[key] = (window_start, current + cost if allowed else current, previous)
+            return allowed
+
+    def evict_idle(self, window, now):
+        cutoff = now - now % window - window
+        with self.lock:
+            idle = [key for key, (start, _, _) in self.counters.items() if start < cutoff]
+            for key in idle:
+                del self.counters[key]
+        return len(idle)
+
+
+class SQLiteBackend:
+    """Counters in a local SQLite file so every uvicorn worker shares one limit.
+
+    Each limiter gets its own `table`: limiters with different windows may
+    share the file, but eviction only ever sees its own limiter's counters.
+    """
+
+    blocking = True
+
+    def __init__(self, path, table="rate_limits"):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid rate limit table name: {table!r}")
+        self.table = table
+        self.db = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, window_start REAL, current INTEGER, previous INTEGER)"
+        )
+        self.lock = threading.Lock()
+
+    def hit(self, key, limit, window, now, cost=1):
+        return self.hit_all([key], limit, window, now, cost)
+
+    def hit_all(self, keys, limit, window, now, cost=1):
+        """Charge every key if all of them are under the limit, otherwise none"""
+        window_start = now - now % window
+        with self.lock:
+            # BEGIN IMMEDIATE takes the write lock up front, making read-then-update atomic across workers
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                counts = {}
+                for key in keys:
+                    row = self.db.execute(
+                        f"SELECT window_start, current, previous FROM {self.table} WHERE key = ?", (key,)
+                    ).fetchone()
+                    start, current, previous = row or (window_start, 0, 0)
+                    if start != window_start:
+                        previous = current if window_start - start == window else 0
+                        current = 0
+                    counts[key] = (current, previous)
+                allowed = all(
+                    sliding_count(previous, current, window_start, window, now) + cost - 1 < limit
+                    for current, previous in counts.values()
+                )
+                self.db.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)",
+                    [(key, window_start, current + cost if allowed else current, previous)
+                     for key, (current, previous) in counts.items()]
+                )
+                self.db.execute("COMMIT")
+                return allowed
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def evict_idle(self, window, now):
+        cutoff = now - now % window - window
+        with self.lock:
+            return self.db.execute(f"DELETE FROM {self.table} WHERE window_start < ?", (cutoff,)).rowcount
+
+
+def sliding_count(previous, current, window_start, window, now):
+    """Sliding-window-counter estimate: the previous window weighted by its overlap"""
+    overlap = 1 - (now - window_start) / window
+    return previous * overlap + current
+
+
+class RateLimiter:
+    """O(1) sliding-window-counter rate limiter with a pluggable backend.
+
+    Every request is checked against each of its keys (e.g. client IP and
+    user_id) and is rejected if any of them is over the limit; a rejected
+    request is charged to none of its keys, so a user over their limit does
+    not use up the budget of others sharing their IP. A request may carry a
+    `cost` above 1, e.g. the number of messages in a batch.
+    """
+
+    def __init__(self, limit=5, window=60, backend=None):
+        self.limit = limit
+        self.window = window
+        self.backend = backend or InMemoryBackend()
+        self.rejections = 0
+
+    def allow(self, *keys, cost=1):
+        if not self.backend.hit_all(keys, self.limit, self.window, time.time(), cost):
+            self.rejections += 1
+            return False
+        return True
+
+    async def aallow(self, *keys, cost=1):
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.allow, *keys, cost=cost)
+        return self.allow(*keys, cost=cost)
+
+    def evict_idle(self):
+        return self.backend.evict_idle(self.window, time.time())
+
+    async def run_eviction(self, interval=None):
+        """Background loop that drops counters for keys idle longer than two windows"""
+        while True:
+            await asyncio.sleep(interval or self.window)
+            try:
+                await asyncio.to_thread(self.evict_idle)
+            except Exception as e:
+                log_error("rate_limit_eviction_failed", e)
+
+
+def build_backend(name, sqlite_path, table="rate_limits"):
+    if name == "sqlite":
+        return SQLiteBackend(sqlite_path, table)
+    return InMemoryBackend()
@@ -0,0 +1,403 @@
+"""Deadlines, retries and circuit breakers for calls to the LLM and R2.
+
+A request's deadline lives in a contextvar, so every stage it reaches (including
+tasks and executor threads, which copy the context) can see how much time is
+left. Each dependency gets a `DependencyPolicy`: a per-attempt timeout clipped
+to the deadline, jittered exponential backoff, a retry budget shared by all
+callers, and a circuit breaker that fails fast while the dependency is down.
+"""
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from src.observability import (
+    log_event, CIRCUIT_STATE, CIRCUIT_REJECTIONS, DEPENDENCY_RETRIES, DEADLINE_EXCEEDED, LLM_HEDGES
+)
+
+# Absolute time.monotonic() by which the current request must finish, or None
+deadline_var = contextvars.ContextVar("deadline", default=None)
+
+
+class DependencyError(Exception):
+    """A dependency call was refused or ran out of time, rather than failing on its own"""
+
+    def __init__(self, dependency, message):
+        super().__init__(message)
+        self.dependency = dependency
+
+
+class CircuitOpenError(DependencyError):
+    def __init__(self, dependency, retry_after):
+        super().__init__(dependency, f"{dependency} is unavailable (circuit open)")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(DependencyError):
+    def __init__(self, dependency):
+        super().__init__(dependency, f"Request deadline exceeded waiting for {dependency}")
+
+
+class DependencyTimeout(DependencyError):
+    def __init__(self, dependency, timeout):
+        super().__init__(dependency, f"{dependency} did not respond within {timeout:.1f}s")
+
+
+@contextmanager
+def deadline(seconds):
+    """Bound the block, and everything it starts, to `seconds` from now; a tighter outer deadline wins"""
+    expires = time.monotonic() + seconds
+    current = deadline_var.get()
+    token = deadline_var.set(min(expires, current) if current is not None else expires)
+    try:
+        yield
+    finally:
+        deadline_var.reset(token)
+
+
+def detach_deadline():
+    """Drop the inherited deadline in a background task that outlives its request"""
+    deadline_var.set(None)
+
+
+def time_remaining():
+    expires = deadline_var.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+def http_status(error):
+    """Best-effort HTTP status of a client library error (botocore, google-api-core, httpx)"""
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        return response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    for value in (getattr(error, "status_code", None), getattr(error, "code", None),
+                  getattr(response, "status_code", None)):
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_transient(error):
+    """Timeouts, connection errors, throttling and 5xx are worth retrying; other 4xx/3xx are answers"""
+    status = http_status(error)
+    if status is None:
+        return True
+    return status >= 500 or status in (408, 429)
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """Full-jitter exponential backoff: uniform in [0, min(max_delay, base_delay * 2**attempt)]"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class RetryBudget:
+    """Caps retries at a fraction of recent calls so an outage doesn't turn into a retry storm.
+
+    Every call deposits `ratio` tokens and every retry (or hedge) withdraws one,
+    so at steady state at most `ratio` extra requests are sent per request.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open after `failure_threshold` failures,
+    half-open after `reset_timeout` seconds, where a single probe decides whether to close.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    GAUGE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.rejections = 0
+        self.lock = threading.Lock()
+        CIRCUIT_STATE.labels(name).set(0)
+
+    def _transition(self, state):
+        if state != self.state:
+            self.state = state
+            CIRCUIT_STATE.labels(self.name).set(self.GAUGE_VALUES[state])
+            log_event("circuit_breaker_state", dependency=self.name, state=state)
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go to the dependency now"""
+        with self.lock:
+            if self.state == self.OPEN:
+                retry_after = self.opened_at + self.reset_timeout - time.monotonic()
+                if retry_after <= 0:
+                    self._transition(self.HALF_OPEN)
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return
+            self.rejections += 1
+        CIRCUIT_REJECTIONS.labels(self.name).inc()
+        raise CircuitOpenError(self.name, max(0.0, self.opened_at + self.reset_timeout - time.monotonic()))
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.probe_in_flight = False
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def release(self):
+        """The call was abandoned (cancelled or out of time) without telling us anything"""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures, "rejections": self.rejections}
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for picking a hedging delay"""
+
+    def __init__(self, size=200, min_samples=20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, pct):
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class DependencyPolicy:
+    """Timeout, retry and circuit-breaker policy for one dependency.
+
+    `timeout` bounds each attempt of an async call (sync callers rely on the
+    client's own socket timeouts). Only errors `retryable` accepts are retried
+    or count against the breaker; anything else is an answer from a healthy
+    dependency and is raised straight away.
+    """
+
+    def __init__(self, name, timeout=None, max_attempts=3, base_delay=0.1, max_delay=2.0,
+                 failure_threshold=5, reset_timeout=30.0, budget=None, retryable=is_transient):
+        self.name = name
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.budget = budget or RetryBudget()
+        self.retryable = retryable
+        self.retries = 0
+
+    def attempt_timeout(self):
+        """Seconds this attempt may take, or None; raises once the request deadline has passed"""
+        remaining = time_remaining()
+        if remaining is not None and remaining <= 0:
+            DEADLINE_EXCEEDED.labels(self.name).inc()
+            raise DeadlineExceeded(self.name)
+        if remaining is None:
+            return self.timeout
+        return remaining if self.timeout is None else min(self.timeout, remaining)
+
+    def _on_error(self, error, attempt, timeout):
+        """Record a failed attempt; return the backoff delay before retrying, or raise.
+
+        `timeout` is the limit the attempt ran under, or None when nothing here enforced one.
+        """
+        if isinstance(error, asyncio.TimeoutError) and timeout is not None:
+            if self.timeout is None or timeout < self.timeout:
+                # The request deadline, not the dependency's timeout, cut this attempt short
+                self.breaker.release()
+                DEADLINE_EXCEEDED.labels(self.name).inc()
+                raise DeadlineExceeded(self.name) from error
+            self.breaker.record_failure()
+            error = DependencyTimeout(self.name, timeout)
+        elif isinstance(error, CircuitOpenError):
+            raise error
+        elif not self.retryable(error):
+            self.breaker.record_success()
+            raise error
+        else:
+            self.breaker.record_failure()
+
+        if attempt + 1 >= self.max_attempts:
+            raise error
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+        remaining = time_remaining()
+        if remaining is not None and delay >= remaining:
+            raise error
+        if not self.budget.withdraw():
+            DEPENDENCY_RETRIES.labels(self.name, "budget_exhausted").inc()
+            raise error
+        self.retries += 1
+        DEPENDENCY_RETRIES.labels(self.name, "retried").inc()
+        log_event("dependency_retry", dependency=self.name, attempt=attempt + 1,
+                  delay_ms=round(delay * 1000, 1), error=str(error))
+        return delay
+
+    def call(self, func):
+        """Run the blocking `func()` with retries and the breaker"""
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            self.attempt_timeout()
+            self.breaker.allow()
+            try:
+                result = func()
+            except Exception as e:
+                time.sleep(self._on_error(e, attempt, None))
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, func):
+        """Await `func()` (a coroutine factory) with a per-attempt timeout, retries and the breaker"""
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            timeout = self.attempt_timeout()
+            self.breaker.allow()
+            try:
+                result = await asyncio.wait_for(func(), timeout)
+            except Exception as e:
+                await asyncio.sleep(self._on_error(e, attempt, timeout))
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def astream(self, func):
+        """Iterate `func()` (an async-iterator factory).
+
+        Retries are only possible until the first item arrives; after that each
+        item must arrive within the request deadline.
+        """
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            timeout = self.attempt_timeout()
+            self.breaker.allow()
+            iterator = func().__aiter__()
+            try:
+                first = await asyncio.wait_for(iterator.__anext__(), timeout)
+            except StopAsyncIteration:
+                self.breaker.record_success()
+                return
+            except Exception as e:
+                await self._aclose(iterator)
+                await asyncio.sleep(self._on_error(e, attempt, timeout))
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.release()
+                await self._aclose(iterator)
+                raise
+            break
+
+        try:
+            yield first
+            while True:
+                remaining = time_remaining()
+                if remaining is not None and remaining <= 0:
+                    DEADLINE_EXCEEDED.labels(self.name).inc()
+                    raise DeadlineExceeded(self.name)
+                try:
+                    item = await asyncio.wait_for(iterator.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError as e:
+                    DEADLINE_EXCEEDED.labels(self.name).inc()
+                    raise DeadlineExceeded(self.name) from e
+                yield item
+        except DependencyError:
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        finally:
+            await self._aclose(iterator)
+        self.breaker.record_success()
+
+    async def _aclose(self, iterator):
+        aclose = getattr(iterator, "aclose", None)
+        if aclose:
+            try:
+                await aclose()
+            except Exception:
+                pass
+
+    def stats(self):
+        return {"circuit": self.breaker.stats(), "retries": self.retries}
+
+
+async def hedged(func, delay, budget=None):
+    """Await `func()`, starting a second copy if the first hasn't finished after `delay` seconds.
+
+    Returns whichever finishes first and cancels the other. With no delay (not
+    enough latency samples yet) or no retry budget left, it is a plain call.
+    """
+    if delay is None:
+        return await func()
+    first = asyncio.ensure_future(func())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or (budget is not None and not budget.withdraw()):
+            return await first
+        second = asyncio.ensure_future(func())
+        tasks.append(second)
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    LLM_HEDGES.labels("hedge" if task is second else "primary").inc()
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,166 @@
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def normalize_message(message):
+    """Normalize a user message so trivially different phrasings share a cache key"""
+    return " ".join(message.lower().split()).rstrip("?!. ")
+
+
+def response_cache_key(message, prompt_version, model_name):
+    raw = f"{model_name}\x00{prompt_version}\x00{normalize_message(message)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of context-free LLM responses, bounded by entries and bytes.
+
+    When `path` is set, entries are also written to a SQLite file so they
+    survive restarts; memory stays the first tier and disk hits are promoted.
+    Each entry keeps the latency of the LLM call that produced it, which is
+    what a hit saves.
+    """
+
+    def __init__(self, max_entries=500, max_bytes=20 * 1024 * 1024, ttl_seconds=86400, path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.entries = OrderedDict()  # key -> (response, created_at, latency)
+        self.size_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_latency_seconds = 0.0
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, response TEXT, created_at REAL, latency REAL)"
+            )
+            self.db.commit()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and now - entry[1] >= self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is None and self.db is not None:
+                entry = self._load_from_disk(key, now)
+                if entry:
+                    self._store(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.saved_latency_seconds += entry[2]
+            return entry[0]
+
+    def put(self, key, response, latency=0.0):
+        entry = (response, time.time(), latency)
+        with self.lock:
+            self._store(key, entry)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, *entry)
+                )
+                self.db.execute(
+                    "DELETE FROM responses WHERE created_at < ?", (entry[1] - self.ttl_seconds,)
+                )
+                self.db.commit()
+
+    def _load_from_disk(self, key, now):
+        row = self.db.execute(
+            "SELECT response, created_at, latency FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row and now - row[1] < self.ttl_seconds:
+            return row
+        return None
+
+    def _store(self, key, entry):
+        if key in self.entries:
+            self._remove(key)
+        size = len(entry[0].encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        self.entries[key] = entry
+        self.size_bytes += size
+        while len(self.entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        response = self.entries.pop(key)[0]
+        self.size_bytes -= len(response.encode("utf-8"))
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_latency_seconds": round(self.saved_latency_seconds, 3),
+                "entries": len(self.entries),
+                "bytes": self.size_bytes,
+            }
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+
+
+class FlightAbandoned(Exception):
+    """The caller running a coalesced call was cancelled before it finished"""
+
+
+class SingleFlight:
+    """Coalesce identical in-flight calls so N concurrent callers share one result.
+
+    If the caller running the call is cancelled (client disconnect, deadline),
+    the waiters are not: one of them takes over and runs the call itself.
+    """
+
+    def __init__(self):
+        self.inflight = {}
+        self.coalesced = 0
+
+    async def do(self, key, func):
+        future = self.inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        while future is not None:
+            try:
+                # Shield so one caller going away does not cancel the shared call
+                return await asyncio.shield(future)
+            except FlightAbandoned:
+                future = self.inflight.get(key)
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            result = await func()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.set_exception(FlightAbandoned())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an uncoalesced failure is not logged as unhandled
+            future.exception()
+            raise
+        finally:
+            if self.inflight.get(key) is future:
+                del self.inflight[key]
@@ -0,0 +1,108 @@
+import os
+import json
+import sqlite3
+import threading
+from src.storage_base import HistoryStorage
+from src.observability import stage, log_error
+
+
+class SQLiteStorage(HistoryStorage):
+    """Embedded chat history backend with one row per turn.
+
+    Rows are indexed on (user_id, timestamp), so an append is a single INSERT
+    and a page of history is an index range scan instead of loading and
+    sorting the user's whole history. Useful for local development, tests
+    and single-host deployments.
+    """
+
+    def __init__(self, path, max_entries=None):
+        super().__init__(
+            max_workers=int(os.getenv("HISTORY_SQLITE_WORKERS", "4")),
+            max_entries=max_entries,
+            thread_name_prefix="sqlite-storage"
+        )
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "user_id TEXT NOT NULL, "
+            "timestamp TEXT NOT NULL, "
+            "entry TEXT NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS chat_history_user_timestamp ON chat_history (user_id, timestamp)"
+        )
+        self.db.commit()
+        self.lock = threading.Lock()
+
+    def get_history(self, user_id):
+        with stage("sqlite_get"), self.lock:
+            rows = self.db.execute(
+                "SELECT entry FROM chat_history WHERE user_id = ? ORDER BY timestamp", (user_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_page(self, user_id, limit, cursor=None):
+        query = "SELECT entry FROM chat_history WHERE user_id = ?"
+        params = [user_id]
+        if cursor:
+            query += " AND timestamp < ?"
+            params.append(cursor)
+        # Fetch one extra row to learn whether another page exists
+        query += " ORDER BY timestamp DESC LIMIT ?"
+        params.append(limit + 1)
+        with stage("sqlite_page"), self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        page = [json.loads(row[0]) for row in rows[:limit]]
+        next_cursor = page[-1].get('timestamp') if len(rows) > limit and page else None
+        return page, next_cursor
+
+    def get_version(self, user_id):
+        # Ids only grow, so an append, a retention delete or a rewrite all change this pair
+        with stage("sqlite_version"), self.lock:
+            count, last_id = self.db.execute(
+                "SELECT COUNT(*), MAX(id) FROM chat_history WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return f"{count}-{last_id or 0}"
+
+    def append_history(self, user_id, entries):
+        try:
+            with stage("sqlite_append"), self.lock, self.db:
+                self.db.executemany(
+                    "INSERT INTO chat_history (user_id, timestamp, entry) VALUES (?, ?, ?)",
+                    [(user_id, conv.get('timestamp', ''), json.dumps(conv, default=str)) for conv in entries]
+                )
+                self._apply_retention(user_id)
+        except sqlite3.Error as e:
+            # e.g. "database is locked"; the transaction was rolled back and the caller retries
+            log_error("sqlite_save_failed", e, user_id=user_id)
+            return False
+        return True
+
+    def save_history(self, user_id, history):
+        with stage("sqlite_save"), self.lock, self.db:
+            self.db.execute("DELETE FROM chat_history WHERE user_id = ?", (user_id,))
+            self.db.executemany(
+                "INSERT INTO chat_history (user_id, timestamp, entry) VALUES (?, ?, ?)",
+                [(user_id, conv.get('timestamp', ''), json.dumps(conv, default=str)) for conv in history]
+            )
+            self._apply_retention(user_id)
+
+    def delete_history(self, user_id):
+        with stage("sqlite_delete"), self.lock, self.db:
+            self.db.execute("DELETE FROM chat_history WHERE user_id = ?", (user_id,))
+
+    def _apply_retention(self, user_id):
+        # Drop everything older than the newest max_entries turns (an index seek, not a scan)
+        self.db.execute(
+            "DELETE FROM chat_history WHERE user_id = ? AND timestamp < ("
+            "SELECT timestamp FROM chat_history WHERE user_id = ? "
+            "ORDER BY timestamp DESC LIMIT 1 OFFSET ?)",
+            (user_id, user_id, self.max_entries - 1)
+        )
+
+    def close(self):
+        super().close()
+        self.db.close()
@@ -0,0 +1,40 @@
+"""Content-hashed URLs for static assets.
+
+Every file is also served under a name carrying a hash of its bytes
+(`script.js` -> `script.3f2a9c1b7d4e.js`). Pages link to the hashed name,
+which browsers and CDNs may cache for a year without revalidating: a changed
+file gets a new URL. The plain name keeps working and is revalidated on use.
+"""
+import os
+import hashlib
+from starlette.staticfiles import StaticFiles
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+class HashedStaticFiles(StaticFiles):
+    def __init__(self, directory):
+        super().__init__(directory=directory)
+        self.hashed_names = {}  # name -> hashed name
+        self.originals = {}  # hashed name -> name
+        for root, _, filenames in os.walk(directory):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                with open(path, "rb") as handle:
+                    digest = hashlib.sha256(handle.read()).hexdigest()[:12]
+                name = os.path.relpath(path, directory)
+                stem, extension = os.path.splitext(name)
+                hashed = f"{stem}.{digest}{extension}"
+                self.hashed_names[name] = hashed
+                self.originals[hashed] = name
+
+    def url_for(self, name):
+        """Hashed name for `name`, relative to the mount point (unknown names are returned as-is)"""
+        return self.hashed_names.get(os.path.normpath(name), name).replace(os.sep, "/")
+
+    async def get_response(self, path, scope):
+        original = self.originals.get(path)
+        response = await super().get_response(original or path, scope)
+        response.headers["Cache-Control"] = IMMUTABLE if original else REVALIDATE
+        return response
@@ -0,0 +1,90 @@
+import os
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HistoryStorage:
+    """Interface shared by the chat history backends.
+
+    Backends implement the synchronous methods; the async wrappers run them
+    on a bounded thread pool so request handlers never block the event loop.
+    `max_entries` is the per-user retention limit.
+    """
+
+    def __init__(self, max_workers, max_entries=None, thread_name_prefix="history-storage"):
+        self.max_entries = max_entries or int(os.getenv("HISTORY_MAX_ENTRIES", "50"))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+    def warm_up(self):
+        pass
+
+    def get_history(self, user_id):
+        """All retained entries for a user, oldest first; raises if the backend cannot be read"""
+        raise NotImplementedError
+
+    def get_context_history(self, user_id):
+        """History for building prompt context, where a stale copy beats none while storage is failing"""
+        return self.get_history(user_id)
+
+    def save_history(self, user_id, history):
+        """Replace a user's history"""
+        raise NotImplementedError
+
+    def append_history(self, user_id, entries):
+        """Append entries; returns True once they are stored"""
+        raise NotImplementedError
+
+    def delete_history(self, user_id):
+        """Delete a user's stored history; raises if it could not be deleted"""
+        raise NotImplementedError
+
+    def get_page(self, user_id, limit, cursor=None):
+        """Return (entries newest first, next_cursor) for entries older than `cursor`.
+
+        The cursor is the timestamp of the last entry on the previous page. This
+        default loads the whole history; indexed backends override it.
+        """
+        history = sorted(self.get_history(user_id), key=lambda x: x.get('timestamp', ''), reverse=True)
+        if cursor:
+            history = [conv for conv in history if conv.get('timestamp', '') < cursor]
+        page = history[:limit]
+        next_cursor = page[-1].get('timestamp') if len(history) > limit and page else None
+        return page, next_cursor
+
+    def get_version(self, user_id):
+        """Opaque token that changes whenever the user's stored history does, or None if unknown"""
+        return None
+
+    def stats(self):
+        return {}
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        # Carry the request ID and endpoint into the worker thread for logs and metrics
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, context.run, func, *args)
+
+    async def aget_history(self, user_id):
+        return await self._run(self.get_history, user_id)
+
+    async def aget_context_history(self, user_id):
+        return await self._run(self.get_context_history, user_id)
+
+    async def asave_history(self, user_id, history):
+        return await self._run(self.save_history, user_id, history)
+
+    async def aappend_history(self, user_id, entries):
+        return await self._run(self.append_history, user_id, entries)
+
+    async def adelete_history(self, user_id):
+        return await self._run(self.delete_history, user_id)
+
+    async def aget_page(self, user_id, limit, cursor=None):
+        return await self._run(self.get_page, user_id, limit, cursor)
+
+    async def aget_version(self, user_id):
+        return await self._run(self.get_version, user_id)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -1,54 +1,230 @@
 import os
-import json
-import boto3
-from botocore.client import Config
+from botocore.exceptions import ClientError
 from datetime import datetime, timezone
+from src.history_cache import HistoryCache
+from src.history_codec import encode_history, decode_history, CONTENT_TYPE
+from src.storage_base import HistoryStorage
+from src.sqlite_storage import SQLiteStorage
+from src.observability import stage, log_event, log_error, R2_BYTES, CACHE_EVENTS
+from src.resilience import DependencyPolicy
 
-class R2Storage:
-    def __init__(self, app_name):
+class R2Storage(HistoryStorage):
+    def __init__(self, app_name, s3_client=None, max_entries=None):
         self.bucket_name = os.getenv("R2_BUCKET_NAME", "my-apps-data")
         self.app_name = app_name
         self.endpoint = os.getenv("R2_ENDPOINT")
         self.access_key = os.getenv("R2_ACCESS_KEY_ID")
         self.secret_key = os.getenv("R2_SECRET_ACCESS_KEY")
+        # Size of the shared urllib3 pool; boto3 clients are thread-safe so one
+        # client (and its pool) is reused by every request in the process.
+        self.max_pool_connections = int(os.getenv("R2_MAX_POOL_CONNECTIONS", "20"))
         
-        self.s3 = boto3.client(
+        # An injected client (e.g. an in-process stand-in for benchmarks) replaces boto3
+        self.s3 = self._build_client() if self.endpoint and self.access_key and s3_client is None else s3_client
+        # Bounded executor for the blocking boto3 calls made from async handlers;
+        # sized to the connection pool so threads never queue on a socket.
+        super().__init__(
+            max_workers=int(os.getenv("R2_EXECUTOR_WORKERS", str(self.max_pool_connections))),
+            max_entries=max_entries,
+            thread_name_prefix="r2-storage"
+        )
+        # Jittered retries and a circuit breaker shared by every R2 call in the process
+        self.policy = DependencyPolicy(
+            "r2",
+            max_attempts=int(os.getenv("R2_MAX_ATTEMPTS", "3")),
+            failure_threshold=int(os.getenv("R2_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("R2_BREAKER_RESET_SECONDS", "15"))
+        )
+        # Write-through cache of recent user histories, revalidated by ETag
+        self.cache = HistoryCache(
+            max_users=int(os.getenv("HISTORY_CACHE_MAX_USERS", "1000")),
+            ttl_seconds=float(os.getenv("HISTORY_CACHE_TTL_SECONDS", "300"))
+        )
+
+    def _build_client(self):
+        # boto3 takes ~150ms to import, so it is only loaded when a real client is needed
+        import boto3
+        from botocore.client import Config
+        return boto3.client(
             "s3",
             endpoint_url=self.endpoint,
             aws_access_key_id=self.access_key,
             aws_secret_access_key=self.secret_key,
-            config=Config(signature_version="s3v4"),
+            config=Config(
+                signature_version="s3v4",
+                max_pool_connections=self.max_pool_connections,
+                tcp_keepalive=True,
+                connect_timeout=float(os.getenv("R2_CONNECT_TIMEOUT_SECONDS", "2")),
+                read_timeout=float(os.getenv("R2_READ_TIMEOUT_SECONDS", "5")),
+                # Retries are done by self.policy, within the request deadline and retry budget
+                retries={"total_max_attempts": 1, "mode": "standard"}
+            ),
             region_name="auto"
-        ) if self.endpoint and self.access_key else None
+        )
+
+    def warm_up(self):
+        """Open a pooled connection to R2 ahead of the first request"""
+        if not self.s3: return
+        try:
+            self.s3.head_bucket(Bucket=self.bucket_name)
+        except Exception as e:
+            log_error("r2_warm_up_failed", e)
 
     def _get_key(self, user_id):
         return f"agents_history/{self.app_name}/{user_id}.json"
 
     def get_history(self, user_id):
         if not self.s3: return []
+        return self._load_history(user_id)[0]
+
+    def get_context_history(self, user_id):
+        if not self.s3: return []
+        return self._load_history(user_id, stale_ok=True)[0]
+
+    def _load_history(self, user_id, stale_ok=False):
+        """Return (history, etag), served from the cache while the entry is fresh.
+
+        Errors other than a missing object are raised, unless `stale_ok` and a
+        stale cached copy exists to fall back on.
+        """
+        cached = self.cache.get(user_id)
+        if cached and cached[2]:
+            CACHE_EVENTS.labels("history", "hit").inc()
+            return cached[0], cached[1]
         try:
-            response = self.s3.get_object(Bucket=self.bucket_name, Key=self._get_key(user_id))
-            return json.loads(response["Body"].read().decode("utf-8"))
-        except Exception:
-            return []
+            params = {"Bucket": self.bucket_name, "Key": self._get_key(user_id)}
+            if cached and cached[1]:
+                # Stale entry: a conditional GET costs a 304 instead of the full body
+                params["IfNoneMatch"] = cached[1]
+            with stage("r2_get"):
+                response = self.policy.call(lambda: self.s3.get_object(**params))
+                body = response["Body"].read()
+            R2_BYTES.labels("read").inc(len(body))
+            # Handles both the versioned (compressed) format and legacy plain JSON
+            history = decode_history(body)
+            if cached:
+                self.cache.record_miss()
+            CACHE_EVENTS.labels("history", "miss").inc()
+            self.cache.put(user_id, history, response.get("ETag"))
+            return history, response.get("ETag")
+        except ClientError as e:
+            status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+            if cached and status == 304:
+                CACHE_EVENTS.labels("history", "revalidated").inc()
+                self.cache.touch(user_id)
+                return cached[0], cached[1]
+            CACHE_EVENTS.labels("history", "miss").inc()
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                # Cache the absence too, so new users don't hit R2 on every turn
+                self.cache.put(user_id, [], None)
+                return [], None
+            log_error("r2_get_failed", e, user_id=user_id)
+            if stale_ok and cached:
+                return self._stale(cached)
+            raise
+        except Exception as e:
+            log_error("r2_get_failed", e, user_id=user_id)
+            if stale_ok and cached:
+                return self._stale(cached)
+            raise
+
+    def _stale(self, cached):
+        # While R2 is failing, a stale copy is better context than none
+        CACHE_EVENTS.labels("history", "stale").inc()
+        return cached[0], cached[1]
+
+    def get_version(self, user_id):
+        """The object's ETag, from the history cache when fresh (a 304 revalidation otherwise)"""
+        if not self.s3: return None
+        _, etag = self._load_history(user_id)
+        return etag or "empty"
 
     def save_history(self, user_id, history):
         if not self.s3: return
         try:
-            # Keep only last 50
-            history = history[-50:]
-            self.s3.put_object(
+            history = history[-self.max_entries:]
+            response = self._put_history(user_id, history)
+            self.cache.put(user_id, history, response.get("ETag"))
+        except Exception as e:
+            self.cache.invalidate(user_id)
+            log_error("r2_save_failed", e, user_id=user_id)
+
+    def _put_history(self, user_id, history, policy=None, **conditions):
+        # Always written in the current format, which lazily migrates legacy objects
+        body = encode_history(history)
+        with stage("r2_put"):
+            response = (policy or self.policy).call(lambda: self.s3.put_object(
                 Bucket=self.bucket_name,
                 Key=self._get_key(user_id),
-                Body=json.dumps(history, default=str),
-                ContentType="application/json"
-            )
-        except Exception as e:
-            print(f"R2 Save Error: {e}")
+                Body=body,
+                ContentType=CONTENT_TYPE,
+                **conditions
+            ))
+        R2_BYTES.labels("written").inc(len(body))
+        return response
+
+    def put_history_if_match(self, user_id, history, etag, policy=None):
+        """Replace a user's history only if the stored object is still at `etag`.
+
+        Raises ClientError 412 if it was written since, or 404 if it was deleted.
+        `policy` lets a background caller retry under its own breaker rather
+        than the one guarding request traffic.
+        """
+        response = self._put_history(user_id, history, policy=policy, IfMatch=etag)
+        self.cache.put(user_id, history, response.get("ETag"))
+        return response
+
+    def append_history(self, user_id, entries, max_attempts=3):
+        """Append entries to a user's history with a conditional write.
+
+        The PUT carries If-Match on the ETag the history was read at (or
+        If-None-Match: * for a new object), so a concurrent update from another
+        request or worker fails with 412 and the append is retried on fresh data
+        instead of silently overwriting it.
+        """
+        if not self.s3: return True
+        for attempt in range(max_attempts):
+            try:
+                history, etag = self._load_history(user_id)
+                history = (history + entries)[-self.max_entries:]
+                conditions = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+                response = self._put_history(user_id, history, **conditions)
+                self.cache.put(user_id, history, response.get("ETag"))
+                return True
+            except ClientError as e:
+                self.cache.invalidate(user_id)
+                status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+                # 404: the object was deleted (by another worker or maintenance) after our ETag
+                # was cached; the retry re-reads and creates it with If-None-Match: *
+                if status in (404, 409, 412):
+                    log_event("r2_save_conflict", user_id=user_id, attempt=attempt + 1, status=status)
+                    continue
+                log_error("r2_save_failed", e, user_id=user_id)
+                return False
+            except Exception as e:
+                self.cache.invalidate(user_id)
+                log_error("r2_save_failed", e, user_id=user_id)
+                return False
+        log_event("r2_save_gave_up", user_id=user_id, attempts=max_attempts)
+        return False
 
     def delete_history(self, user_id):
         if not self.s3: return
         try:
-            self.s3.delete_object(Bucket=self.bucket_name, Key=self._get_key(user_id))
-        except Exception:
-            pass
+            with stage("r2_delete"):
+                self.policy.call(lambda: self.s3.delete_object(Bucket=self.bucket_name, Key=self._get_key(user_id)))
+            self.cache.put(user_id, [], None)
+        except Exception as e:
+            self.cache.invalidate(user_id)
+            log_error("r2_delete_failed", e, user_id=user_id)
+            raise
+
+    def stats(self):
+        return {"history_cache": self.cache.stats(), "r2": self.policy.stats()}
+
+
+def build_storage(app_name):
+    """Select the chat history backend from HISTORY_BACKEND (r2 or sqlite)"""
+    if os.getenv("HISTORY_BACKEND", "r2") == "sqlite":
+        return SQLiteStorage(os.getenv("HISTORY_SQLITE_PATH", "chat_history.db"))
+    return R2Storage(app_name)
@@ -111,9 +111,9 @@ class SREChatInterface {
         });
     }
     async sendToAPI(message) {
-        // Sends the user message to the backend and handles the response
+        // Streams the response from the backend (SSE) and renders it as it arrives
         try {
-            const apiUrl = '/api/chat';
+            const apiUrl = '/api/chat/stream';
             const response = await fetch(apiUrl, {
                 method: 'POST',
                 headers: {
@@ -124,23 +124,59 @@ class SREChatInterface {
                     user_id: this.currentUserId
                 })
             });
-            if (response.ok) {
-                const data = await response.json();
-                // Remove typing indicator
-                this.hideTypingIndicator();
-                this.currentUserId = data.user_id;
-                // Persist userId for future visits
-                localStorage.setItem('sre_user_id', this.currentUserId);
-                this.addMessage(data.response, 'bot');
-            } else {
+            if (!response.ok || !response.body) {
                 this.hideTypingIndicator();
                 this.addMessage('Sorry, there was a problem getting a response from the AI.', 'bot');
+                return;
+            }
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let content = '';
+            let messageDiv = null;
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                // SSE messages are separated by a blank line
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const event of events) {
+                    if (!event.startsWith('data: ')) continue;
+                    const data = JSON.parse(event.slice(6));
+                    if (data.type === 'token') {
+                        content += data.content;
+                        if (!messageDiv) {
+                            // Remove typing indicator on the first chunk
+                            this.hideTypingIndicator();
+                            messageDiv = this.addMessage(content, 'bot');
+                        } else {
+                            this.updateBotMessage(messageDiv, content);
+                        }
+                    } else if (data.type === 'done') {
+                        this.currentUserId = data.user_id;
+                        // Persist userId for future visits
+                        localStorage.setItem('sre_user_id', this.currentUserId);
+                    } else if (data.type === 'error') {
+                        this.hideTypingIndicator();
+                        this.addMessage(data.detail, 'bot');
+                    }
+                }
             }
+            this.hideTypingIndicator();
         } catch (error) {
             this.hideTypingIndicator();
             this.addMessage('Network error. Please try again later.', 'bot');
         }
     }
+
+    updateBotMessage(messageDiv, content) {
+        // Re-render a streaming bot message with the content received so far
+        const htmlContent = this.convertMarkdownToHTML(content);
+        messageDiv.querySelector('.message-content').innerHTML = htmlContent;
+        messageDiv.querySelector('.pdf-button').onclick = () => this.saveToPDF(htmlContent);
+        this.chatMessages.scrollTop = this.chatMessages.scrollHeight;
+    }
     constructor() {
         this.chatInput = document.getElementById('chatInput');
         this.sendButton = document.getElementById('sendButton');
@@ -232,6 +268,8 @@ class SREChatInterface {
                 block: 'nearest' 
             });
         }, 100);
+
+        return messageDiv;
     }
 
     showTypingIndicator() {
@@ -466,17 +504,9 @@ class SREChatInterface {
         const existing = document.getElementById('chatHistoryModal');
         if (existing) existing.remove();
         try {
-            const apiUrl = '/api/chat-history';
-            const response = await fetch(apiUrl, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    user_id: this.currentUserId,
-                    limit: 50
-                })
-            });
+            // GET so the browser can revalidate with the ETag and reuse an unchanged history (304)
+            const params = new URLSearchParams({ user_id: this.currentUserId, limit: 50 });
+            const response = await fetch(`/api/chat-history?${params}`);
             if (response.ok) {
                 const data = await response.json();
                 const allHistory = data.history || [];
@@ -653,17 +683,9 @@ class SREChatInterface {
         // Load last 5 chat interactions for the user on page load
         if (!this.currentUserId) return;
         try {
-            const apiUrl = '/api/chat-history';
-            const response = await fetch(apiUrl, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    user_id: this.currentUserId,
-                    limit: 5
-                })
-            });
+            // GET so the browser can revalidate with the ETag and reuse an unchanged history (304)
+            const params = new URLSearchParams({ user_id: this.currentUserId, limit: 5 });
+            const response = await fetch(`/api/chat-history?${params}`);
             if (response.ok) {
                 const data = await response.json();
                 const history = data.history || [];
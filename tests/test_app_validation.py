@@ -0,0 +1,24 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+
+@pytest.fixture
+def client():
+    # No lifespan: validation happens before any endpoint touches the agent
+    return TestClient(app.app)
+
+
+@pytest.mark.parametrize("max_concurrency", [0, -1])
+def test_batch_rejects_non_positive_concurrency(client, max_concurrency):
+    response = client.post("/api/chat/batch", json={"messages": ["hi"], "max_concurrency": max_concurrency})
+    assert response.status_code == 422
+
+
+def test_history_post_rejects_non_positive_limit(client):
+    assert client.post("/api/chat-history", json={"user_id": "u1", "limit": 0}).status_code == 422
+
+
+def test_history_get_rejects_non_positive_limit(client):
+    assert client.get("/api/chat-history", params={"user_id": "u1", "limit": 0}).status_code == 422
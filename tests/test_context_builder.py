@@ -0,0 +1,95 @@
+import asyncio
+
+from benchmarks.fakes import FakeChatModel, FakeS3Client
+from src.ai_agent import AI_Agent
+from src.context_builder import ContextBuilder
+from src.storage_helper import R2Storage
+
+
+def entry(n):
+    return {"user_message": f"question {n} " * 20, "bot_response": f"<p>answer {n}</p> " * 20,
+            "timestamp": f"2026-01-01T00:00:{n:02d}"}
+
+
+def make_agent(monkeypatch, first_token_latency=0.0):
+    # A budget of a couple of turns, so older turns overflow into the summary
+    monkeypatch.setenv("CONTEXT_TOKEN_BUDGET", "300")
+    monkeypatch.setenv("RESPONSE_CACHE_PATH", "")
+    llm = FakeChatModel(output_tokens=5, first_token_latency=first_token_latency, tokens_per_second=1e6)
+    storage = R2Storage("test", s3_client=FakeS3Client())
+    storage.save_history("u1", [entry(n) for n in range(6)])
+    return AI_Agent("test", llm=llm, storage=storage)
+
+
+async def wait_for_background(agent):
+    while agent.background_tasks:
+        await asyncio.gather(*agent.background_tasks)
+
+
+def test_revoked_update_does_not_write_its_summary():
+    builder = ContextBuilder()
+    generation = builder.claim_update("u1")
+    assert builder.claim_update("u1") is None
+    builder.forget("u1")
+    newer = builder.claim_update("u1")
+    assert builder.set_summary("u1", "stale", "t", generation) is False
+    builder.release_update("u1", generation)
+    assert builder.get_summary("u1") == ("", "")
+    # The newer claim is still held and can write
+    assert builder.set_summary("u1", "fresh", "t", newer) is True
+    builder.release_update("u1", newer)
+    assert builder.updating == {}
+
+
+def test_deleting_history_forgets_the_summary(monkeypatch):
+    async def scenario():
+        agent = make_agent(monkeypatch)
+        await agent.aget_chat_context("u1")
+        await wait_for_background(agent)
+        assert (await agent.aget_chat_context("u1")).startswith("Summary of earlier conversation:")
+        await agent.adelete_chat_history("u1")
+        context = await agent.aget_chat_context("u1")
+        await agent.aclose()
+        return context
+
+    assert asyncio.run(scenario()) == ""
+
+
+def test_summary_update_running_during_a_delete_is_discarded(monkeypatch):
+    async def scenario():
+        agent = make_agent(monkeypatch, first_token_latency=0.1)
+        await agent.aget_chat_context("u1")
+        assert agent.background_tasks  # the summary LLM call is in flight
+        await agent.adelete_chat_history("u1")
+        await wait_for_background(agent)
+        summary = agent.context_builder.get_summary("u1")
+        await agent.aclose()
+        return summary
+
+    assert asyncio.run(scenario()) == ("", "")
+
+
+def test_token_counts_are_cached_outside_the_entry():
+    builder = ContextBuilder(max_cached_turns=2)
+    conv = entry(0)
+    tokens = builder.turn_tokens(conv)
+    assert "tokens" not in conv
+    assert builder.turn_tokens(dict(conv)) == tokens
+    builder.turn_tokens(entry(1))
+    builder.turn_tokens(entry(2))
+    assert len(builder.turn_token_counts) == 2
+
+
+def test_history_pages_do_not_expose_token_counts(monkeypatch):
+    async def scenario():
+        agent = make_agent(monkeypatch)
+        # Stored by an earlier version that kept the count on the entry
+        agent.storage.save_history("u2", [{**entry(0), "tokens": 42}])
+        agent.queue_chat_history("u2", "new question", "new answer")
+        page, _ = await agent.aget_chat_history_page("u2", 10)
+        await agent.aclose()
+        return page
+
+    page = asyncio.run(scenario())
+    assert len(page) == 2
+    assert all("tokens" not in conv for conv in page)
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from benchmarks.fakes import FakeChatModel, FakeS3Client, FaultInjector
+from src.ai_agent import AI_Agent
+from src.storage_helper import R2Storage
+
+
+def entry(n):
+    return {"user_message": f"q{n}", "bot_response": f"a{n}", "timestamp": f"2026-01-01T00:00:{n:02d}"}
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_PATH", "")
+    monkeypatch.setenv("HISTORY_FLUSH_WINDOW_SECONDS", "60")
+    storage = R2Storage("test", s3_client=FakeS3Client(faults=FaultInjector()))
+    storage.policy.base_delay = 0.0
+    agent = AI_Agent("test", llm=FakeChatModel(), storage=storage)
+    monkeypatch.setattr(app, "agent", agent)
+    yield agent
+    storage.close()
+
+
+@pytest.fixture
+def client(agent):
+    # No lifespan: the agent is injected above instead of being warmed up
+    return TestClient(app.app)
+
+
+def open_breaker(storage):
+    for _ in range(storage.policy.breaker.failure_threshold):
+        storage.policy.breaker.record_failure()
+
+
+def test_history_read_with_r2_breaker_open_is_503(agent, client):
+    agent.storage.save_history("u1", [entry(0)])
+    agent.storage.cache.invalidate("u1")
+    open_breaker(agent.storage)
+    response = client.get("/api/chat-history", params={"user_id": "u1"})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers and "ETag" not in response.headers
+    assert client.post("/api/chat-history", json={"user_id": "u1"}).status_code == 503
+
+
+def test_history_read_with_r2_failing_is_an_error_not_an_empty_page(agent, client):
+    agent.storage.s3.faults.down = True
+    response = client.get("/api/chat-history", params={"user_id": "u1"})
+    assert response.status_code == 500
+    assert "ETag" not in response.headers
+
+
+def test_failed_delete_is_reported_and_keeps_the_history(agent, client):
+    agent.storage.save_history("u1", [entry(0)])
+    open_breaker(agent.storage)
+    response = client.request("DELETE", "/api/chat-history", json={"user_id": "u1"})
+    assert response.status_code == 503
+    assert (agent.storage.bucket_name, agent.storage._get_key("u1")) in agent.storage.s3.objects
+
+
+def test_prompt_context_falls_back_to_a_stale_copy(agent):
+    storage = agent.storage
+    storage.save_history("u1", [entry(0)])
+    storage.cache.ttl_seconds = 0  # every cached copy is now stale
+    storage.s3.faults.down = True
+    with pytest.raises(Exception, match="SlowDown"):
+        storage.get_history("u1")
+    assert asyncio.run(agent.aload_history("u1")) == [entry(0)]
+
+
+def test_history_etag_revalidates_until_the_history_changes(agent, client):
+    agent.storage.save_history("u1", [entry(0)])
+    first = client.get("/api/chat-history", params={"user_id": "u1"})
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "private, no-cache"
+    etag = first.headers["ETag"]
+
+    revalidated = client.get("/api/chat-history", params={"user_id": "u1"}, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304 and revalidated.headers["ETag"] == etag
+    # A weakened copy of the tag (e.g. from a compressing proxy) still matches
+    weak = client.get("/api/chat-history", params={"user_id": "u1"}, headers={"If-None-Match": f"W/{etag}"})
+    assert weak.status_code == 304
+    # Another page of the same history is a different representation
+    other_page = client.get("/api/chat-history", params={"user_id": "u1", "limit": 5},
+                            headers={"If-None-Match": etag})
+    assert other_page.status_code == 200
+
+    # A queued turn changes the version before it is even written (queued directly:
+    # queue_chat_history would start its flush timer, which needs a running loop)
+    agent.history_writer.pending["u1"].append(agent.build_history_entry("q1", "a1"))
+    queued = client.get("/api/chat-history", params={"user_id": "u1"}, headers={"If-None-Match": etag})
+    assert queued.status_code == 200 and queued.headers["ETag"] != etag
+    assert [conv["user_message"] for conv in queued.json()["history"]] == ["q1", "q0"]
+
+    asyncio.run(agent.history_writer.flush("u1"))
+    written = client.get("/api/chat-history", params={"user_id": "u1"}, headers={"If-None-Match": etag})
+    assert written.status_code == 200 and written.headers["ETag"] not in (etag, queued.headers["ETag"])
+
+
+def test_post_history_is_never_answered_304(agent, client):
+    agent.storage.save_history("u1", [entry(0)])
+    etag = client.get("/api/chat-history", params={"user_id": "u1"}).headers["ETag"]
+    response = client.post("/api/chat-history", json={"user_id": "u1"}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_hashed_assets_are_immutable_and_plain_names_revalidate(client):
+    hashed = app.static_files.url_for("script.js")
+    assert hashed != "script.js" and hashed.startswith("script.") and hashed.endswith(".js")
+    response = client.get(f"/static/{hashed}")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    plain = client.get("/static/script.js")
+    assert plain.status_code == 200 and plain.content == response.content
+    assert plain.headers["Cache-Control"] == "no-cache"
+
+
+def test_changed_asset_gets_a_new_hashed_name(tmp_path):
+    from src.static_assets import HashedStaticFiles
+    (tmp_path / "app.css").write_text("body { color: red }")
+    before = HashedStaticFiles(str(tmp_path)).url_for("app.css")
+    (tmp_path / "app.css").write_text("body { color: blue }")
+    assert HashedStaticFiles(str(tmp_path)).url_for("app.css") != before
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from src import history_codec
+from src.history_codec import CODEC_IDS, MAGIC, decode_history, encode_history
+
+HISTORY = [
+    {"user_message": f"question {n} ünïcode", "bot_response": f"<p>answer {n}</p>" * 20,
+     "timestamp": f"2026-01-01T00:00:{n:02d}+00:00"}
+    for n in range(20)
+]
+
+
+@pytest.mark.parametrize("codec", sorted(CODEC_IDS))
+def test_each_codec_round_trips(codec):
+    if codec == "zstd" and history_codec.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    body = encode_history(HISTORY, codec=codec)
+    assert body[:len(MAGIC)] == MAGIC and body[len(MAGIC)] == CODEC_IDS[codec]
+    assert decode_history(body) == HISTORY
+
+
+def test_compressed_codecs_are_smaller_than_plain():
+    plain = len(encode_history(HISTORY, codec="none"))
+    assert len(encode_history(HISTORY, codec="gzip")) < plain
+
+
+def test_legacy_plain_json_is_read():
+    legacy = json.dumps(HISTORY).encode("utf-8")
+    assert decode_history(legacy) == HISTORY
+    assert decode_history(b"[]") == []
+
+
+def test_reads_without_orjson(monkeypatch):
+    body = encode_history(HISTORY, codec="gzip")
+    monkeypatch.setattr(history_codec, "orjson", None)
+    assert decode_history(body) == HISTORY
+    assert decode_history(encode_history(HISTORY, codec="none")) == HISTORY
+
+
+def test_zstd_falls_back_to_gzip_without_zstandard(monkeypatch):
+    monkeypatch.setattr(history_codec, "zstandard", None)
+    monkeypatch.delenv("HISTORY_COMPRESSION", raising=False)
+    assert history_codec.default_codec() == "gzip"
+    monkeypatch.setenv("HISTORY_COMPRESSION", "zstd")
+    assert history_codec.default_codec() == "gzip"
+
+
+def test_unknown_codec_id_is_rejected():
+    with pytest.raises(ValueError):
+        decode_history(MAGIC + bytes([99]) + b"payload")
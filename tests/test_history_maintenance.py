@@ -0,0 +1,82 @@
+from benchmarks.fakes import FakeS3Client, FaultInjector
+from src.history_maintenance import HistoryMaintenance
+from src.storage_helper import R2Storage
+
+
+def entry(n):
+    return {"user_message": f"q{n}", "bot_response": f"a{n}", "timestamp": f"2026-01-01T00:00:{n:02d}"}
+
+
+def make_storage(users=0, faults=None, max_entries=None):
+    storage = R2Storage("test", s3_client=FakeS3Client(faults=faults), max_entries=max_entries)
+    for n in range(users):
+        storage.save_history(f"u{n}", [entry(n)])
+    return storage
+
+
+def make_maintenance(storage, **kwargs):
+    # idle_days=-1 puts the cutoff in the future, so every object counts as idle
+    kwargs.setdefault("idle_days", -1)
+    return HistoryMaintenance(storage, ops_per_second=0, **kwargs)
+
+
+def stored_keys(storage):
+    return sorted(key for _, key in storage.s3.objects)
+
+
+def test_idle_histories_are_deleted_at_the_end_of_every_page():
+    storage = make_storage(users=5)
+    summary = make_maintenance(storage, page_size=2).run_once()
+    assert summary["deleted"] == 5 and summary["errors"] == 0
+    assert storage.s3.calls["DeleteObjects"] == 3
+    assert stored_keys(storage) == []
+    storage.close()
+
+
+def test_history_written_after_listing_is_not_deleted():
+    storage = make_storage(users=2)
+    maintenance = make_maintenance(storage)
+    listed = storage.s3.list_objects_v2(Bucket=storage.bucket_name, Prefix=maintenance.prefix)["Contents"]
+    # A chat turn lands for u0 between the listing and the delete
+    assert storage.append_history("u0", [entry(9)])
+    summary = {"deleted": 0, "bytes_reclaimed": 0, "errors": 0}
+    maintenance.delete_idle(listed, summary)
+    assert summary["deleted"] == 1 and summary["errors"] == 0
+    assert stored_keys(storage) == [storage._get_key("u0")]
+    assert storage.get_history("u0") == [entry(0), entry(9)]
+    storage.close()
+
+
+def test_maintenance_failures_do_not_open_the_request_breaker():
+    faults = FaultInjector()
+    storage = make_storage(users=1, faults=faults)
+    maintenance = make_maintenance(storage)
+    maintenance.policy.base_delay = 0.0
+    faults.down = True
+    summary = maintenance.run_once()
+    assert summary["errors"] == 1
+    assert maintenance.policy.breaker.state == "open"
+    assert storage.policy.breaker.state == "closed"
+    assert storage.policy.breaker.failures == 0
+    storage.close()
+
+
+def test_pass_stops_while_the_request_breaker_is_open():
+    storage = make_storage(users=3)
+    for _ in range(storage.policy.breaker.failure_threshold):
+        storage.policy.breaker.record_failure()
+    summary = make_maintenance(storage).run_once()
+    assert summary["stopped_early"] and summary["scanned"] == 0
+    assert len(stored_keys(storage)) == 3
+    storage.close()
+
+
+def test_oversized_history_is_compacted_with_a_conditional_put():
+    storage = make_storage(max_entries=50)
+    storage.save_history("u1", [entry(n % 60) for n in range(50)])
+    storage.max_entries = 5
+    maintenance = make_maintenance(storage, idle_days=90, compact_bytes=0)
+    summary = maintenance.run_once()
+    assert summary["compacted"] == 1 and summary["errors"] == 0
+    assert storage.get_history("u1") == [entry(n % 60) for n in range(45, 50)]
+    storage.close()
@@ -0,0 +1,173 @@
+import asyncio
+
+from benchmarks.fakes import FakeS3Client
+from src.history_writer import HistoryWriter
+from src.storage_helper import R2Storage
+
+
+class RecordingStorage:
+    """Async storage stub that records every append and can be told to fail"""
+
+    def __init__(self, fail=False, delay=0.0, error_for=()):
+        self.fail = fail
+        self.delay = delay
+        self.error_for = set(error_for)  # users whose writes raise instead of returning False
+        self.appends = []
+        self.deleted = []
+
+    async def aappend_history(self, user_id, entries):
+        await asyncio.sleep(self.delay)
+        self.appends.append((user_id, list(entries)))
+        if user_id in self.error_for:
+            raise RuntimeError("database is locked")
+        return not self.fail
+
+    async def adelete_history(self, user_id):
+        self.deleted.append(user_id)
+
+
+async def wait_for(predicate, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+
+def entry(n):
+    return {"user_message": f"q{n}", "bot_response": f"a{n}", "timestamp": f"2026-01-01T00:00:{n:02d}"}
+
+
+def test_appends_within_window_are_merged_into_one_write():
+    async def scenario():
+        storage = RecordingStorage()
+        writer = HistoryWriter(storage, flush_window=0.05)
+        for n in range(3):
+            writer.append("u1", entry(n))
+        writer.append("u2", entry(9))
+        await wait_for(lambda: not writer.pending)
+        return storage, writer
+
+    storage, writer = asyncio.run(scenario())
+    assert sorted(storage.appends) == [("u1", [entry(0), entry(1), entry(2)]), ("u2", [entry(9)])]
+    assert writer.pending == {}
+    assert writer.stats()["entries_written"] == 4
+
+
+def test_entries_queued_during_a_flush_are_written_next_in_order():
+    async def scenario():
+        storage = RecordingStorage(delay=0.05)
+        writer = HistoryWriter(storage, flush_window=0.02)
+        writer.append("u1", entry(0))
+        await wait_for(lambda: writer.locks["u1"].locked())  # first flush is now writing
+        writer.append("u1", entry(1))
+        assert writer.pending_entries("u1") == [entry(0), entry(1)]
+        await wait_for(lambda: not writer.pending)
+        return storage
+
+    storage = asyncio.run(scenario())
+    assert storage.appends == [("u1", [entry(0)]), ("u1", [entry(1)])]
+
+
+def test_failed_write_keeps_entries_queued_and_retries():
+    async def scenario():
+        storage = RecordingStorage(fail=True)
+        writer = HistoryWriter(storage, flush_window=0.02)
+        writer.append("u1", entry(0))
+        await wait_for(lambda: storage.appends)
+        assert writer.pending_entries("u1") == [entry(0)]
+        writer.append("u1", entry(1))
+        storage.fail = False
+        await wait_for(lambda: not writer.pending)
+        return storage, writer
+
+    storage, writer = asyncio.run(scenario())
+    assert storage.appends[-1] == ("u1", [entry(0), entry(1)])
+    assert writer.pending == {}
+    assert writer.stats()["failed_flushes"] == 1
+
+
+def test_storage_error_is_retried_like_a_failed_write():
+    async def scenario():
+        storage = RecordingStorage(error_for={"u1"})
+        writer = HistoryWriter(storage, flush_window=0.02)
+        writer.append("u1", entry(0))
+        await wait_for(lambda: storage.appends)
+        assert writer.pending_entries("u1") == [entry(0)]
+        assert "u1" in writer.flush_tasks  # a retry is scheduled
+        storage.error_for.clear()
+        await wait_for(lambda: not writer.pending)
+        return storage, writer
+
+    storage, writer = asyncio.run(scenario())
+    assert storage.appends == [("u1", [entry(0)]), ("u1", [entry(0)])]
+    assert writer.stats()["failed_flushes"] == 1
+
+
+def test_entries_are_dropped_after_max_attempts():
+    async def scenario():
+        storage = RecordingStorage(fail=True)
+        writer = HistoryWriter(storage, flush_window=0.01, max_attempts=3)
+        writer.append("u1", entry(0))
+        await wait_for(lambda: not writer.pending)  # attempts at ~0.01, 0.03 and 0.07s
+        return storage, writer
+
+    storage, writer = asyncio.run(scenario())
+    assert len(storage.appends) == 3
+    assert writer.pending == {}
+    assert writer.attempts == {}
+
+
+def test_close_flushes_everything_without_waiting_for_the_window():
+    async def scenario():
+        storage = RecordingStorage()
+        writer = HistoryWriter(storage, flush_window=60)
+        writer.append("u1", entry(0))
+        writer.append("u2", entry(1))
+        await writer.close()
+        return storage, writer
+
+    storage, writer = asyncio.run(scenario())
+    assert sorted(storage.appends) == [("u1", [entry(0)]), ("u2", [entry(1)])]
+    assert writer.pending == {} and writer.flush_tasks == {}
+
+
+def test_close_flushes_other_users_when_one_write_raises():
+    async def scenario():
+        storage = RecordingStorage(error_for={"u1"})
+        writer = HistoryWriter(storage, flush_window=60)
+        writer.append("u1", entry(0))
+        writer.append("u2", entry(1))
+        await writer.close()
+        return storage, writer
+
+    storage, writer = asyncio.run(scenario())
+    assert sorted(storage.appends) == [("u1", [entry(0)]), ("u2", [entry(1)])]
+    assert writer.pending_entries("u1") == [entry(0)]
+    assert writer.pending_entries("u2") == []
+
+
+def test_delete_drops_queued_entries():
+    async def scenario():
+        storage = RecordingStorage()
+        writer = HistoryWriter(storage, flush_window=0.02)
+        writer.append("u1", entry(0))
+        await writer.delete("u1")
+        await asyncio.sleep(0.05)
+        return storage
+
+    storage = asyncio.run(scenario())
+    assert storage.appends == []
+    assert storage.deleted == ["u1"]
+
+
+def test_r2_append_recreates_an_object_deleted_behind_the_cached_etag():
+    s3 = FakeS3Client()
+    storage = R2Storage("test", s3_client=s3)
+    assert storage.append_history("u1", [entry(0)])
+    # Deleted out of band (another worker, maintenance); our cache still holds the old ETag
+    s3.delete_object(Bucket=storage.bucket_name, Key=storage._get_key("u1"))
+    assert storage.append_history("u1", [entry(1)])
+    storage.cache.invalidate("u1")
+    assert storage.get_history("u1") == [entry(1)]
+    storage.close()
@@ -0,0 +1,101 @@
+import pytest
+
+from src.rate_limiter import InMemoryBackend, SQLiteBackend, RateLimiter, sliding_count
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        backend = SQLiteBackend(str(tmp_path / "limits.db"))
+        yield backend
+        backend.db.close()
+    else:
+        yield InMemoryBackend()
+
+
+def hits(backend, key, count, now, limit=10, window=60, cost=1):
+    return [backend.hit(key, limit, window, now, cost) for _ in range(count)]
+
+
+def test_limit_is_enforced_within_a_window(backend):
+    assert hits(backend, "ip:a", 10, now=600) == [True] * 10
+    assert backend.hit("ip:a", 10, 60, 601) is False
+    # Other keys have their own counters
+    assert backend.hit("ip:b", 10, 60, 601) is True
+
+
+def test_previous_window_is_weighted_by_its_overlap(backend):
+    hits(backend, "k", 10, now=600)
+    # Halfway into the next window the previous 10 hits count as 5
+    assert sliding_count(10, 0, 660, 60, 690) == 5
+    assert hits(backend, "k", 5, now=690) == [True] * 5
+    assert backend.hit("k", 10, 60, 690) is False
+
+
+def test_counts_older_than_the_previous_window_are_forgotten(backend):
+    hits(backend, "k", 10, now=600)
+    assert backend.hit("k", 10, 60, 610) is False
+    # Two windows later nothing from the first window still counts
+    assert hits(backend, "k", 10, now=720) == [True] * 10
+
+
+def test_rejected_hits_are_not_counted(backend):
+    hits(backend, "k", 12, now=600)
+    # Rolling over: only the 10 allowed hits carry into the previous window
+    assert hits(backend, "k", 1, now=659.99) == [False]
+    assert sliding_count(10, 0, 660, 60, 690) == 5
+    assert hits(backend, "k", 5, now=690) == [True] * 5
+
+
+def test_cost_charges_several_hits_at_once(backend):
+    assert backend.hit("k", 10, 60, 600, cost=8) is True
+    assert backend.hit("k", 10, 60, 600, cost=3) is False
+    assert backend.hit("k", 10, 60, 600, cost=2) is True
+
+
+def test_idle_keys_are_evicted_after_two_windows(backend):
+    hits(backend, "old", 10, now=700)
+    hits(backend, "recent", 10, now=730)
+    # At t=790 the current window starts at 780: "old" (window 660) no longer
+    # counts, "recent" (window 720) is the previous window and still does
+    assert backend.evict_idle(60, 790) == 1
+    assert backend.hit("old", 10, 60, 790, cost=10) is True
+    assert backend.hit("recent", 10, 60, 790, cost=5) is False
+
+
+def test_rate_limiter_checks_every_key(monkeypatch):
+    limiter = RateLimiter(limit=2, window=60)
+    monkeypatch.setattr("src.rate_limiter.time.time", lambda: 600.0)
+    assert limiter.allow("ip:a", "user:1")
+    assert limiter.allow("ip:b", "user:1")
+    assert not limiter.allow("ip:c", "user:1")
+    assert limiter.rejections == 1
+    # The rejected request was not charged to ip:c
+    assert limiter.allow("ip:c", "user:2")
+    assert limiter.allow("ip:c", "user:3")
+
+
+def test_rejected_request_charges_none_of_its_keys(backend):
+    hits(backend, "user:1", 2, now=600, limit=2)
+    assert backend.hit_all(["ip:a", "user:1"], 2, 60, 600) is False
+    assert backend.hit_all(["ip:a", "user:2"], 2, 60, 600) is True
+    assert backend.hit_all(["ip:a", "user:3"], 2, 60, 600) is True
+    assert backend.hit_all(["ip:a", "user:4"], 2, 60, 600) is False
+
+
+def test_limiters_sharing_a_sqlite_file_evict_only_their_own_counters(tmp_path):
+    path = str(tmp_path / "limits.db")
+    chat = SQLiteBackend(path)
+    batch = SQLiteBackend(path, table="batch_rate_limits")
+    chat.hit("user:1", 5, 60, 600)
+    batch.hit("user:1", 100, 3600, 600, cost=90)
+    # A chat-window eviction an hour-window limiter would consider fresh
+    assert chat.evict_idle(60, 790) == 1
+    assert batch.hit("user:1", 100, 3600, 790, cost=20) is False
+    chat.db.close()
+    batch.db.close()
+
+
+def test_sqlite_table_name_must_be_an_identifier(tmp_path):
+    with pytest.raises(ValueError):
+        SQLiteBackend(str(tmp_path / "limits.db"), table="limits; DROP TABLE x")
@@ -0,0 +1,181 @@
+import time
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from benchmarks.fakes import FakeChatModel, FakeLLMError, FakeMessage, FakeS3Client, FaultInjector
+from src.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded, DependencyPolicy, DependencyTimeout,
+    RetryBudget, deadline, hedged
+)
+
+PROMPT = [FakeMessage("What is an error budget?")]
+
+
+def fast_model(faults=None, first_token_latency=0.0):
+    return FakeChatModel(output_tokens=4, first_token_latency=first_token_latency,
+                         tokens_per_second=1e6, faults=faults)
+
+
+def policy(name, **kwargs):
+    kwargs.setdefault("base_delay", 0.0)
+    return DependencyPolicy(name, **kwargs)
+
+
+def test_breaker_opens_fails_fast_and_closes_after_a_successful_probe():
+    faults = FaultInjector()
+    s3 = FakeS3Client(faults=faults)
+    r2 = policy("test_breaker_cycle", max_attempts=1, failure_threshold=3, reset_timeout=0.05)
+    list_bucket = lambda: s3.list_objects_v2(Bucket="b")
+
+    faults.down = True
+    for _ in range(3):
+        with pytest.raises(Exception, match="SlowDown"):
+            r2.call(list_bucket)
+    assert r2.breaker.state == "open"
+
+    # Open: refused without reaching the dependency
+    with pytest.raises(CircuitOpenError):
+        r2.call(list_bucket)
+    assert s3.calls["ListObjectsV2"] == 3
+
+    # Half-open: the probe fails and the breaker opens again
+    time.sleep(0.06)
+    with pytest.raises(Exception, match="SlowDown"):
+        r2.call(list_bucket)
+    assert r2.breaker.state == "open"
+
+    # Half-open again: the dependency has recovered, the probe closes the breaker
+    faults.down = False
+    time.sleep(0.06)
+    r2.call(list_bucket)
+    assert r2.breaker.state == "closed"
+    assert r2.breaker.failures == 0
+
+
+def test_half_open_breaker_lets_a_single_probe_through():
+    breaker = CircuitBreaker("test_single_probe", failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    breaker.allow()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_transient_errors_are_retried():
+    async def scenario():
+        model = fast_model(FaultInjector(error_rate=1.0))
+        llm = policy("test_retry_5xx", max_attempts=3)
+        with pytest.raises(FakeLLMError):
+            await llm.acall(lambda: model.ainvoke(PROMPT))
+        return model, llm
+
+    model, llm = asyncio.run(scenario())
+    assert model.calls == 3
+    assert llm.retries == 2
+    assert llm.breaker.failures == 3
+
+
+def test_client_errors_are_not_retried_and_do_not_trip_the_breaker():
+    calls = []
+
+    def rejected():
+        calls.append(1)
+        raise FakeLLMError(status_code=400, message="bad request")
+
+    llm = policy("test_no_retry_4xx", max_attempts=3, failure_threshold=1)
+    with pytest.raises(FakeLLMError):
+        llm.call(rejected)
+    assert len(calls) == 1
+    assert llm.retries == 0
+    assert llm.breaker.state == "closed"
+
+
+def test_retries_stop_when_the_budget_is_exhausted():
+    faults = FaultInjector()
+    faults.down = True
+    s3 = FakeS3Client(faults=faults)
+    r2 = policy("test_budget", max_attempts=5, failure_threshold=100,
+                budget=RetryBudget(ratio=0.0, max_tokens=1.0))
+    before = REGISTRY.get_sample_value(
+        "sre_agent_dependency_retries_total", {"dependency": "test_budget", "result": "budget_exhausted"}
+    ) or 0
+
+    with pytest.raises(Exception, match="SlowDown"):
+        r2.call(lambda: s3.head_bucket(Bucket="b"))
+    assert s3.calls["HeadBucket"] == 2  # one retry, paid with the only token
+    with pytest.raises(Exception, match="SlowDown"):
+        r2.call(lambda: s3.head_bucket(Bucket="b"))
+    assert s3.calls["HeadBucket"] == 3  # no tokens left: no retry
+    assert r2.retries == 1
+    assert REGISTRY.get_sample_value(
+        "sre_agent_dependency_retries_total", {"dependency": "test_budget", "result": "budget_exhausted"}
+    ) == before + 2
+
+
+def test_slow_dependency_is_a_timeout_and_counts_against_the_breaker():
+    async def scenario():
+        model = fast_model(first_token_latency=0.5)
+        llm = policy("test_dependency_timeout", timeout=0.05, max_attempts=1)
+        with pytest.raises(DependencyTimeout):
+            await llm.acall(lambda: model.ainvoke(PROMPT))
+        return llm
+
+    llm = asyncio.run(scenario())
+    assert llm.breaker.failures == 1
+
+
+def test_running_out_of_request_time_is_a_deadline_and_spares_the_breaker():
+    async def scenario():
+        model = fast_model(first_token_latency=0.5)
+        llm = policy("test_deadline", timeout=5.0, max_attempts=3)
+        with deadline(0.05):
+            with pytest.raises(DeadlineExceeded):
+                await llm.acall(lambda: model.ainvoke(PROMPT))
+        return model, llm
+
+    model, llm = asyncio.run(scenario())
+    assert model.calls == 1
+    assert llm.retries == 0
+    assert llm.breaker.failures == 0
+
+
+def test_expired_deadline_is_raised_before_calling_the_dependency():
+    async def scenario():
+        model = fast_model()
+        llm = policy("test_expired_deadline")
+        with deadline(0.0):
+            with pytest.raises(DeadlineExceeded):
+                await llm.acall(lambda: model.ainvoke(PROMPT))
+        return model
+
+    assert asyncio.run(scenario()).calls == 0
+
+
+def test_hedge_wins_when_the_primary_is_slow():
+    # Seed 1 with slow_rate=0.5: the first call is slow, the second is not
+    faults = FaultInjector(slow_rate=0.5, slow_latency=1.0, seed=1)
+    model = fast_model(faults)
+    before = REGISTRY.get_sample_value("sre_agent_llm_hedged_requests_total", {"winner": "hedge"}) or 0
+
+    async def scenario():
+        started = time.monotonic()
+        result = await hedged(lambda: model.ainvoke(PROMPT), delay=0.05)
+        return result, time.monotonic() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result.content
+    assert elapsed < 0.5
+    assert model.calls == 2 and faults.slow_calls == 1
+    assert REGISTRY.get_sample_value("sre_agent_llm_hedged_requests_total", {"winner": "hedge"}) == before + 1
+
+
+def test_no_hedge_without_retry_budget():
+    faults = FaultInjector(slow_rate=0.5, slow_latency=0.1, seed=1)
+    model = fast_model(faults)
+    result = asyncio.run(hedged(lambda: model.ainvoke(PROMPT), delay=0.01, budget=RetryBudget(max_tokens=0.0)))
+    assert result.content
+    assert model.calls == 1
@@ -0,0 +1,62 @@
+import asyncio
+
+from src.response_cache import SingleFlight
+
+
+def test_identical_calls_are_coalesced():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def func():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.do("k", func) for _ in range(5)))
+        return results, calls, flight
+
+    results, calls, flight = asyncio.run(scenario())
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+    assert flight.coalesced == 4
+    assert flight.inflight == {}
+
+
+def test_cancelled_leader_hands_the_call_to_a_follower():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def func():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        leader = asyncio.create_task(flight.do("k", func))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(flight.do("k", func)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        return leader, results, calls, flight
+
+    leader, results, calls, flight = asyncio.run(scenario())
+    assert leader.cancelled()
+    assert results == ["answer"] * 3
+    assert len(calls) == 2  # the leader's call, then one follower's
+    assert flight.inflight == {}
+
+
+def test_leader_failure_is_shared_with_followers():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def func():
+            await asyncio.sleep(0.02)
+            raise RuntimeError("model down")
+
+        return await asyncio.gather(*(flight.do("k", func) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,97 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from benchmarks.fakes import FakeChatModel
+from src.ai_agent import AI_Agent
+from src.sqlite_storage import SQLiteStorage
+
+
+def entry(n):
+    return {"user_message": f"q{n}", "bot_response": f"a{n}", "timestamp": f"2026-01-01T00:00:{n:02d}"}
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "history.db"), max_entries=50)
+    yield storage
+    storage.close()
+
+
+def test_pages_walk_the_history_newest_first(storage):
+    storage.append_history("u1", [entry(n) for n in range(7)])
+    storage.append_history("u2", [entry(9)])
+    page, cursor = storage.get_page("u1", 3)
+    assert page == [entry(6), entry(5), entry(4)] and cursor == entry(4)["timestamp"]
+    page, cursor = storage.get_page("u1", 3, cursor)
+    assert page == [entry(3), entry(2), entry(1)] and cursor == entry(1)["timestamp"]
+    page, cursor = storage.get_page("u1", 3, cursor)
+    assert page == [entry(0)] and cursor is None
+
+
+def test_last_full_page_has_no_cursor(storage):
+    storage.append_history("u1", [entry(n) for n in range(6)])
+    _, cursor = storage.get_page("u1", 3)
+    page, cursor = storage.get_page("u1", 3, cursor)
+    assert page == [entry(2), entry(1), entry(0)] and cursor is None
+
+
+def test_retention_keeps_the_newest_entries(tmp_path, monkeypatch):
+    monkeypatch.setenv("HISTORY_MAX_ENTRIES", "3")
+    storage = SQLiteStorage(str(tmp_path / "history.db"))
+    storage.append_history("u1", [entry(n) for n in range(2)])
+    storage.append_history("u1", [entry(n) for n in range(2, 5)])
+    assert storage.get_history("u1") == [entry(2), entry(3), entry(4)]
+    storage.save_history("u1", [entry(n) for n in range(10, 15)])
+    assert storage.get_history("u1") == [entry(12), entry(13), entry(14)]
+    storage.close()
+
+
+def test_version_changes_on_append_and_delete(storage):
+    empty = storage.get_version("u1")
+    storage.append_history("u1", [entry(0)])
+    first = storage.get_version("u1")
+    assert first != empty and storage.get_version("u1") == first
+    storage.append_history("u1", [entry(1)])
+    second = storage.get_version("u1")
+    assert second != first
+    storage.delete_history("u1")
+    assert storage.get_version("u1") not in (first, second)
+
+
+def test_append_returns_false_while_the_database_is_locked(storage):
+    storage.db.execute("PRAGMA busy_timeout = 0")
+    other = sqlite3.connect(storage.path)
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        assert storage.append_history("u1", [entry(0)]) is False
+    finally:
+        other.rollback()
+        other.close()
+    assert storage.append_history("u1", [entry(0)]) is True
+    assert storage.get_history("u1") == [entry(0)]
+
+
+def test_history_page_merges_queued_turns_with_stored_ones(storage, monkeypatch):
+    monkeypatch.setenv("HISTORY_FLUSH_WINDOW_SECONDS", "60")
+    monkeypatch.setenv("RESPONSE_CACHE_PATH", "")
+
+    async def scenario():
+        agent = AI_Agent("test", llm=FakeChatModel(), storage=storage)
+        storage.append_history("u1", [entry(n) for n in range(3)])
+        # Queued for write-behind, newer than anything stored
+        agent.queue_chat_history("u1", "q10", "a10")
+        agent.queue_chat_history("u1", "q11", "a11")
+        queued = agent.history_writer.pending_entries("u1")
+        first, cursor = await agent.aget_chat_history_page("u1", 3)
+        second, last_cursor = await agent.aget_chat_history_page("u1", 3, cursor)
+        agent.history_writer.pending.clear()
+        await agent.history_writer.close()
+        return queued, first, cursor, second, last_cursor
+
+    queued, first, cursor, second, last_cursor = asyncio.run(scenario())
+    assert first == [queued[1], queued[0], entry(2)]
+    assert cursor == entry(2)["timestamp"]
+    assert second == [entry(1), entry(0)]
+    assert last_cursor is None